@@ -0,0 +1,162 @@
+"""benchmarks for the ingestion and retrieval hot paths on synthetic data. runs offline.
+run with: python -m benchmarks --segments 10000 --output results.json"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.synthetic import StubOpenAI, synthetic_docs, use_tiktoken_or_stand_in
+from src.config import Config
+from src.doc_store import DocStore
+from src.docselector import DocSelector
+from src.retrievers.notion import NotionRetriever
+from src.retrievers.slack import SlackRetriever
+
+
+def timed(function, *args, **kwargs) -> tuple[float, object]:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def latency_stats(seconds: list[float]) -> dict:
+    milliseconds = sorted(s * 1000 for s in seconds)
+    return {
+        'mean_ms': statistics.mean(milliseconds),
+        'p50_ms': milliseconds[len(milliseconds) // 2],
+        'p95_ms': milliseconds[int(len(milliseconds) * 0.95)],
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_config(directory: str, args: argparse.Namespace) -> Config:
+    return Config(args=[
+        '--NOTION_API_KEY', 'benchmark',
+        '--OPENAI_ORG', 'benchmark',
+        '--OPENAI_API_KEY', 'benchmark',
+        '--SLACK_TOKEN', 'benchmark',
+        '--SLACK_SIGNING_SECRET', 'benchmark',
+        '--interface', 'cli',
+        '--file_embeddings', os.path.join(directory, 'embeddings.bin'),
+        '--file_notion', os.path.join(directory, 'notion.db'),
+        '--file_query_embeddings', os.path.join(directory, 'query_embeddings.bin'),
+        '--file_slack', os.path.join(directory, 'slack.db'),
+        '--file_snapshot', os.path.join(directory, 'snapshot.json'),
+        '--file_vector_index', os.path.join(directory, 'vector_index.npz'),
+        '--vector_index', args.vector_index,
+        '--retrieval', args.retrieval,
+        '--query_filters', 'on',
+        '--embeddings_batch_size', str(args.embeddings_batch_size),
+        '--embeddings_workers', str(args.embeddings_workers),
+    ])
+
+
+def run(args: argparse.Namespace) -> dict:
+    directory = tempfile.mkdtemp(prefix='benchmark-')
+    config = make_config(directory, args)
+    tokenizer = use_tiktoken_or_stand_in(config.model_chat)
+    slack_docs, notion_docs = synthetic_docs(args.segments)
+    results = []
+
+    # split docs into segments
+    docs = slack_docs + notion_docs
+    seconds, segments = timed(lambda: [seg for doc in docs for seg in doc.split_into_segments(config)])
+    results.append({'name': 'Doc.split_into_segments', 'docs': len(docs),
+                    'segments': len(segments), 'seconds': seconds})
+
+    # write and read the retriever caches
+    for retriever_type, docs, cache_file in [
+        (SlackRetriever, slack_docs, config.file_slack),
+        (NotionRetriever, notion_docs, config.file_notion),
+    ]:
+        DocStore(cache_file).upsert([])  # an empty store, so the retriever doesn't scrape
+        retriever = retriever_type(config)
+        for doc in docs:
+            retriever.add_doc(doc)
+
+        seconds, _ = timed(retriever.cache_data)
+        results.append({'name': f'{retriever_type.__name__}.cache_data', 'docs': len(docs), 'seconds': seconds})
+
+        retriever.docs = dict()
+        seconds, _ = timed(retriever.load_from_cache)
+        results.append({'name': f'{retriever_type.__name__}.load_from_cache', 'docs': len(docs), 'seconds': seconds})
+
+    # embed all segments (first run), then load everything from the caches (restart)
+    client = StubOpenAI(dim=args.dim, latency=args.api_latency)
+    selector = DocSelector(config, openai_client=client)
+    seconds, _ = timed(selector.fetch_doc_embeddings)
+    results.append({'name': 'DocSelector.fetch_doc_embeddings (cold)', 'segments': len(selector.docs),
+                    'requests': client.embeddings.requests, 'seconds': seconds})
+
+    seconds, _ = timed(selector.fetch_doc_embeddings)
+    results.append({'name': 'DocSelector.fetch_doc_embeddings (warm)', 'segments': len(selector.docs),
+                    'seconds': seconds})
+
+    # start answering queries from the saved snapshot
+    seconds, restarted = timed(DocSelector, config, openai_client=client)
+    results.append({'name': 'DocSelector (start from snapshot)', 'segments': len(restarted.embedded_docs),
+                    'seconds': seconds})
+
+    # answer queries
+    query_seconds = [timed(selector, f'question {i} about w{i}')[0] for i in range(args.queries)]
+    results.append({'name': 'DocSelector.__call__', 'segments': len(selector.embedded_docs),
+                    'queries': args.queries, **latency_stats(query_seconds)})
+
+    # answer queries that only search one slack channel
+    query_seconds = [timed(selector, f'question {i} about w{i} in #channel-{i % 50}')[0] for i in range(args.queries)]
+    results.append({'name': 'DocSelector.__call__ (#channel filter)', 'segments': len(selector.embedded_docs),
+                    'queries': args.queries, **latency_stats(query_seconds)})
+
+    return {
+        'metadata': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'tokenizer': tokenizer,
+            **vars(args),
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--segments', type=int, default=10_000, help='approximate number of segments to generate.')
+    parser.add_argument('--dim', type=int, default=1536, help='embedding dimension.')
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--vector_index', default='brute_force')
+    parser.add_argument('--retrieval', default='vector')
+    parser.add_argument('--embeddings_batch_size', type=int, default=100)
+    parser.add_argument('--embeddings_workers', type=int, default=4)
+    parser.add_argument('--api_latency', type=float, default=0.0, help='simulated seconds per embeddings request.')
+    parser.add_argument('--output', help='file to write the json results to. printed if not set.')
+    args = parser.parse_args()
+
+    output = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
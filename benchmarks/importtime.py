@@ -0,0 +1,72 @@
+"""measures how long it takes to start the app with every interface, using python's -X importtime.
+reports the wall time until the interface class is imported, the total import time and the slowest imports.
+run with: python -m benchmarks.importtime"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# what `python -m src` does before it creates the interface
+STARTUP = '''
+from src.config import Config
+config = Config(args=[
+    '--NOTION_API_KEY', 'benchmark', '--OPENAI_ORG', 'benchmark', '--OPENAI_API_KEY', 'benchmark',
+    '--SLACK_TOKEN', 'benchmark', '--SLACK_SIGNING_SECRET', 'benchmark', '--interface', {interface!r},
+])
+config.get_interface_type()
+'''
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """(module, self microseconds, cumulative microseconds) for every import."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line.removeprefix('import time:').split('|')
+        imports.append((module.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def measure(code: str) -> tuple[float, list[tuple[str, int, int]]]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code], cwd=root, capture_output=True, text=True, check=True
+    )
+    return time.perf_counter() - start, parse_importtime(process.stderr)
+
+
+def run(interfaces: list[str], repeats: int, top: int) -> dict:
+    baseline = statistics.median(measure('pass')[0] for _ in range(repeats))
+    results = {'python_startup_seconds': baseline, 'interfaces': {}}
+
+    for interface in interfaces:
+        runs = [measure(STARTUP.format(interface=interface)) for _ in range(repeats)]
+        _, imports = runs[-1]
+        slowest = sorted(imports, key=lambda item: item[2], reverse=True)
+        results['interfaces'][interface] = {
+            'wall_seconds': statistics.median(seconds for seconds, _ in runs),
+            'import_seconds': statistics.median(sum(self_us for _, self_us, _ in imports) / 1e6 for _, imports in runs),
+            'modules': len(imports),
+            'slowest_imports_ms': {module: cumulative_us / 1000 for module, _, cumulative_us in slowest[:top]},
+        }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--interfaces', nargs='+', default=['cli', 'slack'])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='number of slowest imports to report.')
+    args = parser.parse_args()
+    print(json.dumps(run(args.interfaces, args.repeats, args.top), indent=2))
+
+
+if __name__ == "__main__":
+    main()
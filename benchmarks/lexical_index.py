@@ -0,0 +1,68 @@
+"""measures the BM25 index of hybrid retrieval on synthetic segments: build time (with a cold and a warm term cache),
+query latency and the latency of fusing its results with the vector index.
+run with: python -m benchmarks.lexical_index --segments 200000"""
+
+import argparse
+import json
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from benchmarks.synthetic import random_text, synthetic_embeddings
+from src.indexes import BM25Index, BruteForceIndex, TermCache, reciprocal_rank_fusion
+
+
+def run(segments: int, words: int, dim: int, queries: int, k: int) -> dict:
+    rng = np.random.default_rng(0)
+    texts = [random_text(rng, words) for _ in range(segments)]
+    # identifiers that only occur in a single segment, like ticket numbers
+    for i in rng.choice(segments, size=queries, replace=False):
+        texts[i] += f' INC-{i}'
+    hashes = [f'{i:032x}' for i in range(segments)]
+    query_texts = [f'{random_text(rng, 4)} INC-{i}' for i in rng.choice(segments, size=queries, replace=False)]
+
+    results = {'segments': segments, 'words_per_segment': words, 'queries': queries, 'k': k}
+    term_cache = TermCache()
+    for name in ['build_cold_seconds', 'build_warm_seconds']:
+        index = BM25Index(term_cache)
+        start = time.perf_counter()
+        index.build(texts, hashes)
+        results[name] = time.perf_counter() - start
+    results['vocabulary'] = len(term_cache.vocabulary)
+    results['postings'] = len(index.rows)
+
+    start = time.perf_counter()
+    lexical_rows = [index.search(query, k)[0] for query in query_texts]
+    results['query_ms'] = (time.perf_counter() - start) / queries * 1000
+
+    matrix = synthetic_embeddings(segments + queries, dim, n_topics=max(1, segments // 200))
+    vector_index = BruteForceIndex(SimpleNamespace(file_vector_index=f'{tempfile.mkdtemp()}/vector_index.npz'))
+    vector_index.build(matrix[:segments], hashes)
+    start = time.perf_counter()
+    vector_rows = [vector_index.search(query_vector, k)[0] for query_vector in matrix[segments:]]
+    results['vector_query_ms'] = (time.perf_counter() - start) / queries * 1000
+
+    start = time.perf_counter()
+    for rows, other_rows in zip(vector_rows, lexical_rows):
+        reciprocal_rank_fusion([rows, other_rows])
+    results['fusion_ms'] = (time.perf_counter() - start) / queries * 1000
+    results['hybrid_query_ms'] = results['query_ms'] + results['vector_query_ms'] + results['fusion_ms']
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--segments', type=int, default=100_000)
+    parser.add_argument('--words', type=int, default=150, help='number of words per segment.')
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps(run(args.segments, args.words, args.dim, args.queries, args.k), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""synthetic docs, embeddings and api clients, so the benchmarks run offline and are reproducible."""
+
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+import src.docs.type
+from src.docs import NotionPage, SlackConvo
+
+WORDS = [f'w{i}' for i in range(5000)]
+
+
+def synthetic_embeddings(n: int, dim: int, n_topics: int, seed: int = 0) -> np.ndarray:
+    """normalized embeddings that are clustered around topics, like embeddings of real docs."""
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(n_topics, dim)).astype(np.float32)
+    matrix = topics[rng.integers(n_topics, size=n)] + rng.normal(scale=0.6, size=(n, dim)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def random_text(rng: np.random.Generator, n_words: int) -> str:
+    """words with a zipf-like frequency distribution."""
+    ids = np.minimum(rng.zipf(1.3, size=n_words), len(WORDS)) - 1
+    return ' '.join(WORDS[i] for i in ids)
+
+
+def synthetic_docs(segments: int, seed: int = 0) -> tuple[list[SlackConvo], list[NotionPage]]:
+    """scraped slack messages (one segment each) and notion pages (about four segments each).
+    together they split into roughly the requested number of segments."""
+    rng = np.random.default_rng(seed)
+    start = datetime(2023, 1, 1)
+    n_notion = segments // 20
+    n_slack = segments - 4 * n_notion
+
+    slack_docs = []
+    for i in range(n_slack):
+        timestamp = start + timedelta(seconds=60 * i)
+        channel = f'C{i % 50:08d}'
+        slack_docs.append(SlackConvo(
+            body=random_text(rng, int(rng.integers(5, 80))),
+            header=f'Slack message in #channel-{i % 50} from U{i % 300:08d} at {timestamp}',
+            url=f'https://bench.slack.com/archives/{channel}/p{int(timestamp.timestamp() * 10e6)}',
+            last_edited=timestamp,
+            last_scraped=timestamp,
+        ))
+
+    notion_docs = []
+    for i in range(n_notion):
+        timestamp = start + timedelta(hours=i)
+        notion_docs.append(NotionPage(
+            body=random_text(rng, 1400),
+            header=f'Notion Page: Team {i % 10}/Page {i}\nLast Edited: {timestamp}',
+            url=f'https://www.notion.so/Page-{i:032x}',
+            last_edited=timestamp,
+            last_scraped=timestamp,
+        ))
+
+    return slack_docs, notion_docs
+
+
+class WordEncoding:
+    """stand-in for a tiktoken encoding with one token per word. used when tiktoken can't download its encodings."""
+
+    def __init__(self):
+        self.vocab: dict[str, int] = dict()
+        self.words: list[str] = []
+        self.lock = threading.Lock()
+
+    def encode(self, text: str) -> list[int]:
+        tokens = []
+        for word in text.split(' '):
+            if word not in self.vocab:
+                with self.lock:
+                    self.vocab.setdefault(word, len(self.words))
+                    if len(self.words) < len(self.vocab):
+                        self.words.append(word)
+            tokens.append(self.vocab[word])
+        return tokens
+
+    def decode(self, tokens: list[int]) -> str:
+        return ' '.join(self.words[token] for token in tokens)
+
+
+def tiktoken_available(model: str) -> bool:
+    """whether tiktoken can load the encoding of the model, which it downloads on first use."""
+    try:
+        src.docs.type.get_encoding(model)
+        return True
+    except Exception:
+        return False
+
+
+def use_tiktoken_or_stand_in(model: str) -> str:
+    """returns the name of the tokenizer the benchmarks use."""
+    if tiktoken_available(model):
+        return 'tiktoken'
+    encoding = WordEncoding()
+    src.docs.type.get_encoding = lambda _model: encoding
+    return 'stand-in'
+
+
+class StubEmbeddings:
+    def __init__(self, dim: int, latency: float):
+        """deterministic embeddings for any text. counts requests and optionally simulates api latency."""
+        self.dim = dim
+        self.latency = latency
+        self.requests = 0
+        self.inputs = 0
+        self.lock = threading.Lock()
+
+    def create(self, input: list[str], model: str):
+        with self.lock:
+            self.requests += 1
+            self.inputs += len(input)
+        time.sleep(self.latency)
+        data = [
+            SimpleNamespace(index=i, embedding=self.embedding(text))
+            for i, text in enumerate(input)
+        ]
+        return SimpleNamespace(data=data)
+
+    def embedding(self, text: str) -> list[float]:
+        return np.random.default_rng(zlib.crc32(text.encode())).normal(size=self.dim).tolist()
+
+
+class StubOpenAI:
+    """replaces the openai client in the benchmarks."""
+
+    def __init__(self, dim: int = 1536, latency: float = 0.0):
+        self.embeddings = StubEmbeddings(dim, latency)
@@ -0,0 +1,53 @@
+"""compares the vector indexes on synthetic embeddings: query latency and recall@k of the approximate indexes.
+run with: python -m benchmarks.vector_index --segments 200000"""
+
+import argparse
+import json
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_embeddings
+from src.indexes import BruteForceIndex, IVFIndex
+
+
+def run(segments: int, dim: int, queries: int, k: int, probes: int) -> dict:
+    matrix = synthetic_embeddings(segments + queries, dim, n_topics=max(1, segments // 200))
+    matrix, query_vectors = matrix[:segments], matrix[segments:]
+    hashes = [f'{i:032x}' for i in range(segments)]
+    config = SimpleNamespace(file_vector_index=f'{tempfile.mkdtemp()}/vector_index.npz', ivf_probes=probes)
+
+    results = {'segments': segments, 'dim': dim, 'queries': queries, 'k': k, 'ivf_probes': probes}
+    exact = None
+    for name, index in [('brute_force', BruteForceIndex(config)), ('ivf', IVFIndex(config))]:
+        start = time.perf_counter()
+        index.build(matrix, hashes)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = [index.search(query_vector, k)[0] for query_vector in query_vectors]
+        query_ms = (time.perf_counter() - start) / queries * 1000
+
+        if exact is None:
+            exact = found
+        recall = np.mean([len(np.intersect1d(a, b)) / k for a, b in zip(found, exact)])
+        results[name] = {'build_seconds': build_seconds, 'query_ms': query_ms, f'recall@{k}': float(recall)}
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--segments', type=int, default=100_000)
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--probes', type=int, default=8)
+    args = parser.parse_args()
+    print(json.dumps(run(args.segments, args.dim, args.queries, args.k, args.probes), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,20 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 import atexit
+from datetime import datetime
+import logging
 from src.config import Config
 
+logging.basicConfig(format='%(message)s')
+logging.getLogger('metrics').setLevel(logging.INFO)  # structured timing logs
+
 config = Config()
 interface = config.get_interface()
-interface.refresh_data()
 
+# queries are answered from the last snapshot while the first refresh runs in the background
 scheduler = BackgroundScheduler()
-scheduler.add_job(func=interface.refresh_data, trigger="interval", minutes=config.data_refresh_minutes)
+scheduler.add_job(
+    func=interface.refresh_data, trigger="interval", minutes=config.data_refresh_minutes, next_run_time=datetime.now()
+)
 scheduler.start()
 atexit.register(lambda: scheduler.shutdown())
 
@@ -1,2 +1,8 @@
-from src.chat_interfaces.cli import CliInterface
-from src.chat_interfaces.slack import SlackInterface
+from src.imports import lazy_exports
+
+# interfaces are imported when they are used, since each one pulls in heavy dependencies (e.g. fastapi for slack)
+__getattr__ = lazy_exports(__name__, {
+    'ChatInterface': 'src.chat_interfaces.type',
+    'CliInterface': 'src.chat_interfaces.cli',
+    'SlackInterface': 'src.chat_interfaces.slack',
+})
@@ -8,6 +8,11 @@ class CliInterface(ChatInterface):
             if prompt.lower().strip() == 'exit':
                 break
 
-            print(f'Response: ', end='')
-            response = self.get_response(prompt=prompt, user_id='1')
-            print(response)
+            if not self.doc_selector.is_ready:
+                print(f'Response: {self.loading_message}')
+                continue
+
+            print(f'Response: ', end='', flush=True)
+            for text in self.stream_response(prompt=prompt, user_id='1'):
+                print(text, end='', flush=True)
+            print()
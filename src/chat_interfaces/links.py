@@ -0,0 +1,53 @@
+import re
+
+LINK_PATTERN = re.compile(r'<(Document \w+)\|(.*?)>')
+LINK_START = '<Document '
+
+
+def rewrite_links(text: str, id_2_doc: dict[str, str]) -> str:
+    """replace links to documents in the prompt (<Document N|text>) with links to their urls (<url|text>)."""
+    def replace(match: re.Match) -> str:
+        url = id_2_doc.get(match[1])
+        return f'<{url}|{match[2]}>' if url else match[0]
+    return LINK_PATTERN.sub(replace, text)
+
+
+class LinkRewriter:
+    def __init__(self, id_2_doc: dict[str, str], max_link_length: int = 500):
+        """rewrites links in a response that arrives in chunks.
+        text that may be the start of a link is held back until the link is complete."""
+        self.id_2_doc = id_2_doc
+        self.max_link_length = max_link_length
+        self.pending = ''
+        self.response = ''  # everything that was returned so far
+
+    def add(self, chunk: str) -> str:
+        """the rewritten text that is ready to be shown."""
+        self.pending += chunk
+        start = self.incomplete_link_start(self.pending)
+        if start is None:
+            ready, self.pending = self.pending, ''
+        else:
+            ready, self.pending = self.pending[:start], self.pending[start:]
+        return self.emit(ready)
+
+    def flush(self) -> str:
+        """the text that was held back at the end of the response."""
+        ready, self.pending = self.pending, ''
+        return self.emit(ready)
+
+    def incomplete_link_start(self, text: str) -> int | None:
+        start = text.rfind(LINK_START)
+        if start == -1 or '>' in text[start:]:
+            # the end of the text may be the first characters of a link
+            start = text.rfind('<')
+            if start == -1 or not LINK_START.startswith(text[start:]):
+                return None
+        if len(text) - start > self.max_link_length:
+            return None
+        return start
+
+    def emit(self, text: str) -> str:
+        text = rewrite_links(text, self.id_2_doc)
+        self.response += text
+        return text
@@ -0,0 +1,72 @@
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from src.docs import Doc
+
+if TYPE_CHECKING:
+    from src.config import Config
+
+TOKENS_PER_MESSAGE = 4  # every message is wrapped in a few tokens for its role and separators
+TOKENS_PER_REPLY = 3  # every reply is primed with the assistant role
+DOCS_SEPARATOR = '\n\n'
+
+
+class PromptBuilder:
+    def __init__(self, config: 'Config', system_prompt: str):
+        """builds the messages for the chat model within prompt_token_limit tokens.
+        the system prompt with the docs always fits, since docs are already limited to openai_token_limit tokens.
+        the rest of the budget is filled with the conversation history, newest messages first.
+        the newest message (the user's prompt) is always included.
+
+        system_prompt is a template with {time} and {docs}. the template is tokenized once and the docs are counted
+        with their memoized token counts, so building a prompt never tokenizes the text of the docs."""
+        self.model = config.model_chat
+        self.token_limit = config.prompt_token_limit
+        self.system_prompt = system_prompt
+        self.template_tokens = TOKENS_PER_MESSAGE + Doc.count_tokens(system_prompt.format(docs='', time=''), self.model)
+        self.separator_tokens = Doc.count_tokens(DOCS_SEPARATOR, self.model)
+
+    def count_tokens(self, message: dict[str, str]) -> int:
+        return TOKENS_PER_MESSAGE + Doc.count_tokens(message['content'], self.model)
+
+    @staticmethod
+    def doc_id(i: int) -> str:
+        return f'Document {i}'
+
+    def build(
+            self, docs: list[Doc], history: list[dict[str, str]]
+    ) -> tuple[list[dict[str, str]], dict[str, str], dict[str, int]]:
+        """the messages for the chat model, the mapping from document ids in the system prompt to urls and
+        the number of tokens that were used for every part of the prompt."""
+        labels = [f'({self.doc_id(i)}): ' for i in range(len(docs))]
+        docs_string = DOCS_SEPARATOR.join(label + str(doc) for label, doc in zip(labels, docs))
+        time_string = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        system_message = {'role': 'system', 'content': self.system_prompt.format(docs=docs_string, time=time_string)}
+        id_2_doc = {self.doc_id(i): doc.url for i, doc in enumerate(docs)}
+
+        # tokens don't always split at the borders of the parts, so the sum of the parts is a close estimate
+        docs_tokens = sum(doc.token_count(self.model) for doc in docs)
+        label_tokens = sum(Doc.count_tokens(label, self.model) for label in labels)
+        label_tokens += self.separator_tokens * max(0, len(docs) - 1)
+        system_tokens = self.template_tokens + Doc.count_tokens(time_string, self.model) + label_tokens + docs_tokens
+
+        budget = self.token_limit - system_tokens - TOKENS_PER_REPLY
+        messages, history_tokens = [], 0
+        for message in reversed(history):
+            tokens = self.count_tokens(message)
+            if messages and history_tokens + tokens > budget:
+                break
+            messages.append(message)
+            history_tokens += tokens
+        messages.reverse()
+
+        breakdown = {
+            'system': system_tokens - docs_tokens,
+            'docs': docs_tokens,
+            'history': history_tokens,
+            'history_messages': len(messages),
+            'dropped_messages': len(history) - len(messages),
+            'total': system_tokens + history_tokens + TOKENS_PER_REPLY,
+            'limit': self.token_limit,
+        }
+        return [system_message] + messages, id_2_doc, breakdown
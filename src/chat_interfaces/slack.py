@@ -1,26 +1,118 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI, Request
-from slack_bolt import App
-from slack_bolt.adapter.fastapi import SlackRequestHandler
+from fastapi.responses import JSONResponse, PlainTextResponse
+from slack_bolt.adapter.fastapi.async_handler import AsyncSlackRequestHandler
+from slack_bolt.async_app import AsyncApp, AsyncSay
 
 from src.chat_interfaces.type import ChatInterface
+from src.lru import LRUCache
+from src.metrics import metrics
 
 
 class SlackInterface(ChatInterface):
+    busy_message = "I'm answering a lot of questions right now. Please try again in a minute."
+    placeholder_message = '...'
+    error_message = 'Sorry, something went wrong while answering. Please try again.'
+
     def __call__(self):
-        app = FastAPI()
-        slack_app = App(token=self.config.SLACK_TOKEN, signing_secret=self.config.SLACK_SIGNING_SECRET)
-        handler = SlackRequestHandler(slack_app)
+        uvicorn.run(self.create_app(), host="0.0.0.0", port=self.config.port)
+
+    def create_app(self) -> FastAPI:
+        """events are acknowledged as soon as they arrive and answered by slack_workers workers.
+        slack resends events that weren't acknowledged in 3 seconds, so events that were already received are
+        dropped. when slack_queue_size messages are waiting, new messages are turned away."""
+        slack_app = AsyncApp(token=self.config.SLACK_TOKEN, signing_secret=self.config.SLACK_SIGNING_SECRET)
+        handler = AsyncSlackRequestHandler(slack_app)
+        seen_event_ids = LRUCache(max_size=10_000)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.config.slack_queue_size)
 
         @slack_app.message(".*")
-        def message_handler(message, say):
-            prompt = message['text']
-            user_id = message['user']
-            response = self.get_response(prompt=prompt, user_id=user_id)
-            say(response)
+        async def message_handler(message, say, body):
+            if not seen_event_ids.add_if_missing(body.get('event_id')):
+                metrics.increment('slack_events_total', status='duplicate')
+                return
+
+            try:
+                queue.put_nowait((message, say))
+            except asyncio.QueueFull:
+                metrics.increment('slack_events_total', status='rejected')
+                await say(self.busy_message)
+                return
+            metrics.increment('slack_events_total', status='queued')
+
+        async def worker():
+            while True:
+                message, say = await queue.get()
+                try:
+                    await self.answer(message, say)
+                    metrics.increment('slack_events_total', status='answered')
+                except Exception:
+                    metrics.increment('slack_events_total', status='failed')
+                    logging.exception(f'failed to answer slack message {message.get("ts")}')
+                finally:
+                    queue.task_done()
+
+        @asynccontextmanager
+        async def lifespan(_app: FastAPI):
+            workers = [asyncio.create_task(worker()) for _ in range(self.config.slack_workers)]
+            yield
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        app = FastAPI(lifespan=lifespan)
 
         @app.post("/slack/events")
         async def slack_events(request: Request):
             return await handler.handle(request)
 
-        uvicorn.run(app, host="0.0.0.0", port=self.config.port)
+        @app.get("/ready")
+        async def ready():
+            """ready once there are docs to answer with, either from the last snapshot or from the first refresh."""
+            snapshot = self.doc_selector.snapshot
+            return JSONResponse(
+                {
+                    'ready': self.doc_selector.is_ready,
+                    'snapshot_age_seconds': snapshot.age_seconds if self.doc_selector.is_ready else None,
+                    'segments': len(snapshot.embedded_docs),
+                },
+                status_code=200 if self.doc_selector.is_ready else 503,
+            )
+
+        @app.get("/metrics")
+        async def metrics_endpoint():
+            return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+        return app
+
+    async def answer(self, message: dict, say: AsyncSay):
+        """post a placeholder message and update it while the response is generated.
+        updates are sent at most every slack_stream_update_seconds to stay within slack's rate limits.
+        messages from bots (including this one) and messages without text, e.g. edits, are not answered."""
+        if 'bot_id' in message or not message.get('user') or not message.get('text'):
+            return
+        if not self.doc_selector.is_ready:
+            await say(self.loading_message)
+            return
+
+        placeholder = await say(self.placeholder_message)
+        channel, ts = placeholder['channel'], placeholder['ts']
+
+        response, sent, last_update = '', '', time.monotonic()
+        try:
+            async for text in self.stream_response_async(prompt=message['text'], user_id=message['user']):
+                response += text
+                if time.monotonic() - last_update >= self.config.slack_stream_update_seconds:
+                    await say.client.chat_update(channel=channel, ts=ts, text=response)
+                    sent, last_update = response, time.monotonic()
+        except Exception:
+            # don't leave the placeholder behind, the worker logs the error
+            await say.client.chat_update(channel=channel, ts=ts, text=self.error_message)
+            raise
+        if response != sent:
+            await say.client.chat_update(channel=channel, ts=ts, text=response or self.placeholder_message)
@@ -1,25 +1,36 @@
-import re
+import asyncio
+import time
 from abc import ABC, abstractmethod
-from collections import defaultdict
-from datetime import datetime
-from typing import TYPE_CHECKING
+from typing import AsyncIterator, Iterator, TYPE_CHECKING
 
-from openai import OpenAI
+import numpy as np
+from openai import AsyncOpenAI, OpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
 
+from src.chat_interfaces.links import LinkRewriter, rewrite_links
+from src.chat_interfaces.prompt_builder import PromptBuilder
+from src.docs import Doc
 from src.docselector import DocSelector
+from src.metrics import metrics
+from src.response_cache import ResponseCache
 
 if TYPE_CHECKING:
     from src.config import Config
 
 
 class ChatInterface(ABC):
+    loading_message = "I'm still loading the docs. Please try again in a minute."
+
     def __init__(self, config: 'Config'):
         self.doc_selector = DocSelector(config)
+        self.response_cache = ResponseCache(config)
         self.openai_client = OpenAI(api_key=config.OPENAI_API_KEY, organization=config.OPENAI_ORG)
+        self.async_openai_client = AsyncOpenAI(api_key=config.OPENAI_API_KEY, organization=config.OPENAI_ORG)
         self.config = config
-        self.history: dict[str, list[dict[str, str]]] = defaultdict(list)
+        self.history = config.get_history_store()
         with open(config.file_system_prompt) as f:
             self.system_prompt = f.read()
+        self.prompt_builder = PromptBuilder(config, self.system_prompt)
 
     @abstractmethod
     def __call__(self):
@@ -27,30 +38,145 @@ class ChatInterface(ABC):
 
     def refresh_data(self):
         self.doc_selector.refresh_data()
+        self.response_cache.invalidate({doc.hash for doc in self.doc_selector.embedded_docs})
 
     def get_response(self, prompt: str, user_id: str) -> str:
-        self.history[user_id].append({'role': 'user', 'content': prompt})
-        docs = self.doc_selector(prompt)
-
-        doc_2_id = {doc.url: f'(Document {i})' for i, doc in enumerate(docs)}
-        id_2_doc = {f'Document {i}': doc.url for i, doc in enumerate(docs)}
-
-        docs_string = '\n\n'.join([f'{doc_2_id[doc.url]}: {doc}' for doc in docs])
-        time_string = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        system_prompt = self.system_prompt.format(docs=docs_string, time=time_string)
-        print(system_prompt)
-
-        completion = self.openai_client.chat.completions.create(
-            model=self.config.model_chat,
-            temperature=self.config.model_temperature,
-            messages=[{"role": "system", "content": system_prompt}] + self.history[user_id][-5:]
-        )
-        response = completion.choices[0].message.content
-
-        response = re.sub(r'<(Document \w+)\|(.*?)>', r'<{\1}|\2>', response)
-        response = response.format(**id_2_doc)
+        with metrics.span('get_response'):
+            query_vector, docs = self.select_docs(prompt)
+            history = self.history.get(user_id)
+            if (response := self.cached_response(prompt, user_id, query_vector, docs, history)) is not None:
+                return response
+
+            messages, id_2_doc, _ = self.build_messages(prompt, user_id, docs)
+            with metrics.span('chat_completion', model=self.config.model_chat):
+                completion = self.openai_client.chat.completions.create(**self.completion_kwargs(messages))
+            response = self.finish_response(completion, id_2_doc, user_id)
+            self.response_cache.add(query_vector, docs, history, response)
+            return response
+
+    def stream_response(self, prompt: str, user_id: str) -> Iterator[str]:
+        """same as get_response, but yields the response in chunks while it is generated."""
+        start = time.perf_counter()
+        with metrics.span('get_response', stream=True):
+            query_vector, docs = self.select_docs(prompt)
+            history = self.history.get(user_id)
+            if (response := self.cached_response(prompt, user_id, query_vector, docs, history)) is not None:
+                yield response
+                return
+
+            messages, id_2_doc, prompt_tokens = self.build_messages(prompt, user_id, docs)
+            rewriter = LinkRewriter(id_2_doc)
+            completion = ''
+
+            with metrics.span('chat_completion', model=self.config.model_chat, stream=True):
+                stream = self.openai_client.chat.completions.create(**self.completion_kwargs(messages), stream=True)
+                for chunk in stream:
+                    content = self.chunk_content(chunk)
+                    completion += content
+                    if text := rewriter.add(content):
+                        self.observe_first_token(rewriter, text, start)
+                        yield text
+                if text := rewriter.flush():
+                    yield text
+
+            self.count_stream_tokens(prompt_tokens, completion)
+            self.history.append(user_id, 'assistant', rewriter.response)
+            self.response_cache.add(query_vector, docs, history, rewriter.response)
+
+    async def stream_response_async(self, prompt: str, user_id: str) -> AsyncIterator[str]:
+        """same as stream_response, without blocking the event loop."""
+        start = time.perf_counter()
+        with metrics.span('get_response', stream=True):
+            # selecting docs, tokenizing the prompt and reading and writing the history block, so they run in threads
+            query_vector, docs = await asyncio.to_thread(self.select_docs, prompt)
+            history = await asyncio.to_thread(self.history.get, user_id)
+            response = await asyncio.to_thread(self.cached_response, prompt, user_id, query_vector, docs, history)
+            if response is not None:
+                yield response
+                return
+
+            messages, id_2_doc, prompt_tokens = await asyncio.to_thread(self.build_messages, prompt, user_id, docs)
+            rewriter = LinkRewriter(id_2_doc)
+            completion = ''
+
+            with metrics.span('chat_completion', model=self.config.model_chat, stream=True):
+                stream = await self.async_openai_client.chat.completions.create(
+                    **self.completion_kwargs(messages), stream=True
+                )
+                async for chunk in stream:
+                    content = self.chunk_content(chunk)
+                    completion += content
+                    if text := rewriter.add(content):
+                        self.observe_first_token(rewriter, text, start)
+                        yield text
+                if text := rewriter.flush():
+                    yield text
+
+            await asyncio.to_thread(self.count_stream_tokens, prompt_tokens, completion)
+            await asyncio.to_thread(self.history.append, user_id, 'assistant', rewriter.response)
+            self.response_cache.add(query_vector, docs, history, rewriter.response)
+
+    def select_docs(self, prompt: str) -> tuple[np.ndarray, list['Doc']]:
+        query_vector = self.doc_selector.embed_query(prompt)
+        return query_vector, self.doc_selector.select(query_vector, prompt)
+
+    def cached_response(
+            self, prompt: str, user_id: str, query_vector: np.ndarray, docs: list['Doc'], history: list[dict[str, str]]
+    ) -> str | None:
+        """the response to an earlier, similar prompt for which the same docs were selected after the same history."""
+        response = self.response_cache.get(query_vector, docs, history)
+        if response is not None:
+            self.history.append(user_id, 'user', prompt)
+            self.history.append(user_id, 'assistant', response)
+        return response
 
-        self.history[user_id].append({'role': 'assistant', 'content': response})
+    @staticmethod
+    def chunk_content(chunk: ChatCompletionChunk) -> str:
+        return (chunk.choices[0].delta.content or '') if chunk.choices else ''
+
+    @staticmethod
+    def observe_first_token(rewriter: LinkRewriter, text: str, start: float):
+        if rewriter.response == text:
+            metrics.observe('time_to_first_token_seconds', time.perf_counter() - start)
+
+    def build_messages(
+            self, prompt: str, user_id: str, docs: list['Doc']
+    ) -> tuple[list[dict], dict[str, str], int]:
+        """add the prompt to the user's history and build the messages for the chat model.
+        also returns the mapping from document ids in the prompt to urls and the number of tokens in the prompt."""
+        self.history.append(user_id, 'user', prompt)
+
+        with metrics.span('prompt_assembly', docs=len(docs)):
+            messages, id_2_doc, breakdown = self.prompt_builder.build(docs, self.history.get(user_id))
+        print(messages[0]['content'])
+
+        metrics.log('prompt_budget', user_id=user_id, **breakdown)
+        for part in ('system', 'docs', 'history'):
+            metrics.increment('prompt_tokens_total', breakdown[part], part=part)
+        return messages, id_2_doc, breakdown['total']
+
+    def completion_kwargs(self, messages: list[dict]) -> dict:
+        metrics.increment('openai_api_calls_total', api='chat')
+        return {
+            'model': self.config.model_chat,
+            'temperature': self.config.model_temperature,
+            'messages': messages,
+        }
+
+    def count_stream_tokens(self, prompt_tokens: int, completion: str):
+        """streamed completions don't report their usage, so the tokens are counted here."""
+        completion_tokens = Doc.count_tokens(completion, self.config.model_chat)
+        metrics.increment('openai_tokens_total', prompt_tokens, api='chat', type='prompt')
+        metrics.increment('openai_tokens_total', completion_tokens, api='chat', type='completion')
+
+    def finish_response(self, completion: ChatCompletion, id_2_doc: dict[str, str], user_id: str) -> str:
+        """turn document ids in the completion into links and add the response to the user's history."""
+        if completion.usage is not None:
+            metrics.increment('openai_tokens_total', completion.usage.prompt_tokens, api='chat', type='prompt')
+            metrics.increment('openai_tokens_total', completion.usage.completion_tokens, api='chat', type='completion')
+        response = rewrite_links(completion.choices[0].message.content, id_2_doc)
+
+        self.history.append(user_id, 'assistant', response)
 
         return response
 
@@ -1,18 +1,22 @@
 import argparse
 import os
-from typing import TYPE_CHECKING
+from typing import Collection, TYPE_CHECKING
 
 from dotenv import load_dotenv
 
-from src.chat_interfaces import CliInterface, SlackInterface
+from src.imports import import_class
+
 if TYPE_CHECKING:
-    from src.chat_interfaces import Interface
+    from src.chat_interfaces import ChatInterface
+    from src.history import HistoryStore
+    from src.indexes import VectorIndex
 
 load_dotenv()  # take environment variables from .env.
 
 
 class Config:
-    def __init__(self):
+    def __init__(self, args: list[str] | None = None):
+        """args are parsed as command line arguments. by default, they are read from sys.argv."""
 
         self.NOTION_API_KEY = None
         self.OPENAI_ORG = None
@@ -23,46 +27,115 @@ class Config:
         self.data_refresh_minutes = 60
         self.doc_token_overlap = 50
         self.doc_token_limit = 500
+        self.docs_checkpoint_seconds = 30
+        self.docs_checkpoint_size = 100
+        self.embeddings_batch_size = 1
+        self.embeddings_checkpoint_size = 100
+        self.embeddings_checkpoint_seconds = 30
+        self.embeddings_max_retries = 5
+        self.embeddings_workers = 1
+        self.history = 'memory'
+        self.history_idle_minutes = 24 * 60
+        self.history_length = 5
         self.interface = 'slack'
-        self.file_embeddings = 'data/embeddings.json'
-        self.file_notion = 'data/notion.json'
-        self.file_slack = 'data/slack.json'
+        self.file_embeddings = 'data/embeddings.bin'
+        self.file_history = 'data/history.db'
+        self.file_notion = 'data/notion.db'
+        self.file_query_embeddings = 'data/query_embeddings.bin'
+        self.file_slack = 'data/slack.db'
+        self.file_snapshot = 'data/snapshot.json'
         self.file_system_prompt = 'resources/system_prompt.txt'
+        self.file_vector_index = 'data/vector_index.npz'
+        self.ivf_probes = 8
         self.model_chat = 'gpt-4'  # 'gpt-3.5-turbo-16k'
         self.model_embeddings = 'text-embedding-ada-002'
         self.model_temperature = 0.3
+        self.notion_requests_per_second = 3
+        self.notion_scraping_workers = 8
         self.port = 8000
+        self.prompt_token_limit = 6000
+        self.retrieval = 'vector'
+        self.rrf_k = 60
+        self.query_filters = 'off'
+        self.recency_half_life_days = 0.0
+        self.recency_weight = 0.1
+        self.query_embedding_cache_size = 10_000
+        self.response_cache_similarity = 0.97
+        self.response_cache_size = 1000
+        self.response_cache_ttl_minutes = 60
+        self.slack_queue_size = 100
+        self.slack_stream_update_seconds = 1.0
+        self.slack_thread_lookback_days = 7
+        self.slack_workers = 4
         self.openai_token_limit = 2000
+        self.vector_index = 'brute_force'
 
         # override attributes with env variables
         self.load_env_config()
 
         # override attributes with cli variables
-        self.load_cli_args()
+        self.load_cli_args(args)
 
         # validate that all variables are set
         self.validate_config()
 
+    # options map to the classes that implement them. classes are only imported when they are used,
+    # so e.g. the cli doesn't import fastapi and slack_bolt.
     @property
     def interface_map(self):
         return {
-            'cli': CliInterface,
-            'slack': SlackInterface,
+            'cli': 'src.chat_interfaces.cli.CliInterface',
+            'slack': 'src.chat_interfaces.slack.SlackInterface',
+        }
+
+    def get_interface_type(self) -> type['ChatInterface']:
+        return import_class(self.interface_map[self.interface])
+
+    def get_interface(self) -> 'ChatInterface':
+        return self.get_interface_type()(self)
+
+    @property
+    def history_map(self):
+        return {
+            'memory': 'src.history.memory.MemoryHistoryStore',
+            'sqlite': 'src.history.sqlite.SQLiteHistoryStore',
+        }
+
+    def get_history_store_type(self) -> type['HistoryStore']:
+        return import_class(self.history_map[self.history])
+
+    def get_history_store(self) -> 'HistoryStore':
+        return self.get_history_store_type()(self)
+
+    @property
+    def vector_index_map(self):
+        return {
+            'brute_force': 'src.indexes.brute_force.BruteForceIndex',
+            'ivf': 'src.indexes.ivf.IVFIndex',
         }
 
-    def get_interface(self) -> 'Interface':
-        self.interface = self.interface.lower().strip()
-        assert self.interface in self.interface_map, f'interface {self.interface} must be in {list(self.interface_map)}'
-        return self.interface_map[self.interface](self)
+    def get_vector_index_type(self) -> type['VectorIndex']:
+        return import_class(self.vector_index_map[self.vector_index])
+
+    def get_vector_index(self) -> 'VectorIndex':
+        return self.get_vector_index_type()(self)
 
-    def load_cli_args(self):
+    @property
+    def retrieval_options(self):
+        return ['vector', 'hybrid']
+
+    @property
+    def query_filters_options(self):
+        return ['on', 'off']
+
+    def load_cli_args(self, args: list[str] | None = None):
         parser = argparse.ArgumentParser()
         for arg, val in vars(self).items():
             arg_type = type(val) if val is not None else str
             parser.add_argument(f"--{arg}", type=arg_type, help=self.help_message(arg))
 
-        args = parser.parse_args()
-        for key, value in vars(args).items():
+        parsed_args = parser.parse_args(args)
+        for key, value in vars(parsed_args).items():
             if hasattr(self, key) and value is not None:
                 setattr(self, key, value)
 
@@ -71,13 +144,28 @@ class Config:
             if hasattr(self, key):
                 setattr(self, key, value)
 
+    def validate_option(self, attr: str, options: Collection[str]):
+        value = getattr(self, attr).lower().strip()
+        assert value in options, f'{attr} {value} must be in {list(options)}'
+        setattr(self, attr, value)
+
     def validate_config(self):
-        self.get_interface()
+        self.validate_option('interface', self.interface_map)
+        self.validate_option('history', self.history_map)
+        self.validate_option('retrieval', self.retrieval_options)
+        self.validate_option('query_filters', self.query_filters_options)
+        self.validate_option('vector_index', self.vector_index_map)
 
         none_attrs = [attr for attr in vars(self) if getattr(self, attr) is None]
         if none_attrs:
             raise ValueError(f'{none_attrs} should be defined in environmental variables or command line arguments.')
 
+        if self.prompt_token_limit <= self.openai_token_limit:
+            raise ValueError(
+                f'prompt_token_limit ({self.prompt_token_limit}) should be greater than '
+                f'openai_token_limit ({self.openai_token_limit}).'
+            )
+
         if self.data_refresh_minutes < 5:
             raise ValueError(
                 f'{self.data_refresh_minutes} ({self.data_refresh_minutes}) should be greater than or equal to 5.'
@@ -93,15 +181,51 @@ class Config:
             'data_refresh_minutes': 'Interval in minutes for data refresh.',
             'doc_token_overlap': 'Number of overlapping tokens in retriever documents.',
             'doc_token_limit': 'Limit for the number of tokens in one retriever document.',
+            'docs_checkpoint_seconds': 'Seconds after which scraped docs are written to disk.',
+            'docs_checkpoint_size': 'Number of scraped docs after which they are written to disk.',
+            'embeddings_batch_size': 'Number of docs embedded per API request. Keep at 1 for Azure OpenAI.',
+            'embeddings_checkpoint_size': 'Number of new embeddings after which they are written to disk.',
+            'embeddings_checkpoint_seconds': 'Seconds after which new embeddings are written to disk.',
+            'embeddings_max_retries': 'Number of retries for rate limited or failed embedding requests.',
+            'embeddings_workers': 'Number of embedding requests that are sent concurrently.',
+            'history': f'Where the conversation history is kept. Options: {list(self.history_map)}',
+            'history_idle_minutes': 'Minutes after which the conversation history of an inactive user is forgotten.',
+            'history_length': 'Number of messages per user that are kept and sent to the chat model.',
             'interface': f'How to interact with the bot. Options: {list(self.interface_map)}',
-            'file_embeddings': 'File path for storing embeddings data.',
-            'file_notion': 'File path for storing Notion data.',
+            'file_embeddings': 'File path for storing embeddings data. Old .json files are migrated to a .bin file next to them.',
+            'file_history': 'File path for storing the conversation history if history is sqlite.',
+            'file_notion': 'File path for storing Notion data. Old .json files are migrated to a .db file next to them.',
+            'file_slack': 'File path for storing Slack data. Old .json files are migrated to a .db file next to them.',
+            'file_query_embeddings': 'File path for storing query embeddings. Set to "" to only cache them in memory.',
+            'file_snapshot': 'File path for storing the docs that queries are answered from while the app starts.',
             'file_system_prompt': 'File path for the system prompt text',
+            'file_vector_index': 'File path for storing the IVF vector index.',
+            'ivf_probes': 'Number of IVF clusters that are searched per query. Higher is more accurate but slower.',
             'model_chat': 'Model identifier for the OpenAI chat model.',
             'model_embeddings': 'Model identifier for the OpenAI embeddings model.',
             'model_temperature': 'Temperature setting for the chat model.',
+            'notion_requests_per_second': 'Rate limit for all requests to the Notion API.',
+            'notion_scraping_workers': 'Number of Notion pages that are scraped concurrently.',
             'port': 'Port on which the application runs.',
+            'prompt_token_limit': 'Token limit for the system prompt, docs and conversation history together.',
+            'query_embedding_cache_size': 'Number of query embeddings that are cached (about 6 kB each for ada-002).',
+            'retrieval': f'How docs are found. hybrid also matches the words of the prompt. '
+                         f'Options: {self.retrieval_options}',
+            'rrf_k': 'Constant of reciprocal rank fusion in hybrid retrieval. Higher values weigh lower ranks more.',
+            'query_filters': f'Whether #channels, "in slack", "in notion" and periods like "last week" in a prompt '
+                             f'restrict which docs are searched. Periods only restrict Slack messages. '
+                             f'Options: {self.query_filters_options}',
+            'recency_half_life_days': 'Days after which the recency bonus of a doc halves. 0 disables the bonus.',
+            'recency_weight': 'Recency bonus that is added to the similarity of a doc that was just edited.',
+            'response_cache_similarity': 'Minimum similarity between two prompts for a cached response to be reused.',
+            'response_cache_size': 'Number of sets of selected docs for which responses are cached. 0 disables it.',
+            'response_cache_ttl_minutes': 'Minutes after which a cached response is no longer used.',
+            'slack_queue_size': 'Number of Slack messages that can wait for an answer before new ones are turned away.',
+            'slack_stream_update_seconds': 'Seconds between updates of a Slack message while its answer is generated.',
+            'slack_thread_lookback_days': 'Days before the last Slack refresh to check for new thread replies.',
+            'slack_workers': 'Number of Slack messages that are answered concurrently.',
             'openai_token_limit': 'Token limit for all docs in system prompt.',
+            'vector_index': f'How to search embeddings. Options: {list(self.vector_index_map)}',
         }
 
         message = mapping.get(config_value, f'set {config_value}')
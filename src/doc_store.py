@@ -0,0 +1,115 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Iterable, Iterator
+
+
+class DocStore:
+    def __init__(self, file: str):
+        """stores the docs of a retriever, and the segments they were split into, in a SQLite database. rows are read
+        in batches and written with upserts, so neither loading nor saving ever holds the serialized docs of the whole
+        retriever in memory.
+        the old json cache (<file without extension>.json) is migrated on first use. if file is the old json cache,
+        it is migrated to a .db file next to it."""
+        if file.endswith('.json'):
+            file = os.path.splitext(file)[0] + '.db'
+        self.file = file
+        self.file_legacy_json = os.path.splitext(file)[0] + '.json'
+        self.lock = threading.Lock()
+
+        if not os.path.exists(self.file) and os.path.exists(self.file_legacy_json):
+            self.migrate_from_json(self.file_legacy_json)
+        self.exists = os.path.exists(self.file)  # whether docs were ever stored
+
+        directory = os.path.dirname(self.file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = self.connect(self.file)
+
+    @staticmethod
+    def connect(file: str) -> sqlite3.Connection:
+        connection = sqlite3.connect(file, check_same_thread=False)
+        with connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS docs (url TEXT PRIMARY KEY, data TEXT NOT NULL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS segments (url TEXT PRIMARY KEY, key TEXT NOT NULL, data TEXT NOT NULL)'
+            )
+        return connection
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM docs').fetchone()[0]
+
+    def iter_rows(self, table: str, columns: str, batch_size: int = 1000) -> Iterator[tuple]:
+        """all rows of a table, ordered by url and read in batches. url must be the first column."""
+        last_url = ''
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    f'SELECT {columns} FROM {table} WHERE url > ? ORDER BY url LIMIT ?', (last_url, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_url = rows[-1][0]
+
+    def iter_docs(self, batch_size: int = 1000) -> Iterator[dict[str, str]]:
+        """the saved data of every doc, read in batches."""
+        for _, data in self.iter_rows('docs', 'url, data', batch_size):
+            yield json.loads(data)
+
+    def iter_segments(self, batch_size: int = 1000) -> Iterator[tuple[str, str, list[dict]]]:
+        """(url, key, segments) of every doc whose segments are saved. the key identifies the doc version and
+        settings the segments were made with."""
+        for url, key, data in self.iter_rows('segments', 'url, key, data', batch_size):
+            yield url, key, json.loads(data)
+
+    def upsert(self, docs: Iterable[dict[str, str]], state: dict | None = None):
+        """insert or replace docs (and the retriever state) in one transaction."""
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO docs (url, data) VALUES (?, ?)',
+                ((doc['url'], json.dumps(doc)) for doc in docs),
+            )
+            if state is not None:
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)',
+                    ((key, json.dumps(value)) for key, value in state.items()),
+                )
+        self.exists = True
+
+    def upsert_segments(self, rows: Iterable[tuple[str, str, list[dict]]]):
+        """insert or replace the (url, key, segments) of docs in one transaction."""
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO segments (url, key, data) VALUES (?, ?, ?)',
+                ((url, key, json.dumps(segments)) for url, key, segments in rows),
+            )
+
+    def load_state(self) -> dict:
+        with self.lock:
+            rows = self.connection.execute('SELECT key, value FROM state').fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def migrate_from_json(self, file_json: str):
+        """one-time import of the old json cache, a list of docs."""
+        print(f'Migrating docs from {file_json} to {self.file}...')
+        with open(file_json) as f:
+            docs: list[dict[str, str]] = json.load(f)
+
+        # write to a temporary database first, so an interrupted migration is started again
+        tmp_file = self.file + '.tmp'
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        connection = self.connect(tmp_file)
+        with connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO docs (url, data) VALUES (?, ?)',
+                ((doc['url'], json.dumps(doc)) for doc in docs),
+            )
+        connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        connection.close()
+        os.replace(tmp_file, self.file)
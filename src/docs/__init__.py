@@ -1,3 +1,8 @@
-from src.docs.type import Doc
-from src.docs.notion_page import NotionPage
-from src.docs.slack_convo import SlackConvo
+from src.imports import lazy_exports
+
+# doc types are imported when they are used, since each one pulls in the client of its source (e.g. slack_sdk)
+__getattr__ = lazy_exports(__name__, {
+    'Doc': 'src.docs.type',
+    'NotionPage': 'src.docs.notion_page',
+    'SlackConvo': 'src.docs.slack_convo',
+})
@@ -1,23 +1,31 @@
-from notion_client import Client
-from ratelimit import limits, sleep_and_retry
+from notion_client import APIErrorCode, APIResponseError, Client
 
 from src.docs.type import Doc
+from src.ratelimiter import TokenBucket
 
 
 class NotionPage(Doc):
 
-    def _scrape(self, client: Client):
+    def _scrape(self, client: Client, limiter: TokenBucket):
         if self.is_scraped:
             return
         block_id = self.url[-32:]
+        self.body = ''
         self._depth = 0
-        self.scrape_block(client, block_id)
+        self.scrape_block(client, limiter, block_id)
 
-    @sleep_and_retry
-    @limits(calls=3, period=1)
-    def scrape_block(self, client: Client, block_id: str):
+    def scrape_block(self, client: Client, limiter: TokenBucket, block_id: str):
         """recursively scrapes a block and its children, adding them to self.content"""
-        children = client.blocks.children.list(block_id, page_size=100)['results']
+        children = []
+        start_cursor = None
+        while True:
+            response = self.request(
+                limiter, client.blocks.children.list, block_id, page_size=100, start_cursor=start_cursor
+            )
+            children += response['results']
+            if not response['has_more']:
+                break
+            start_cursor = response['next_cursor']
 
         for block in children:
             formatted_block = self.format_block(block)
@@ -25,9 +33,22 @@ class NotionPage(Doc):
                 self.body += formatted_block.replace('\n', '\n' + self._depth * '  ')
             if block['has_children'] and block['type'] != 'child_page':
                 self._depth += 1
-                self.scrape_block(client, block_id=block['id'])
+                self.scrape_block(client, limiter, block_id=block['id'])
                 self._depth -= 1
 
+    @staticmethod
+    def request(limiter: TokenBucket, method, *args, max_retries: int = 5, **kwargs):
+        """call the notion api within the shared rate limit. when rate limited, waits as long as the
+        retry-after header asks before trying again."""
+        for attempt in range(max_retries + 1):
+            limiter.acquire()
+            try:
+                return method(*args, **kwargs)
+            except APIResponseError as e:
+                if e.code != APIErrorCode.RateLimited or attempt == max_retries:
+                    raise
+                limiter.pause(float(e.headers.get('retry-after', 1)))
+
     @staticmethod
     def format_block(block) -> str | None:
 
@@ -2,7 +2,9 @@ from datetime import datetime
 
 from slack_sdk import WebClient
 
-from src.docs import Doc
+from src.docs.type import Doc
+
+REPLY_PREFIX = '\nReply from '
 
 
 class SlackConvo(Doc):
@@ -23,12 +25,22 @@ class SlackConvo(Doc):
         if not self.is_thread:
             return
 
-        replies = client.conversations_replies(channel=self.channel_id, ts=self.unix_timestamp)['messages'][1:]
+        # drop replies from a previous scrape, they are all fetched again
+        self.body = self.body.split(REPLY_PREFIX)[0]
+
+        replies, cursor = [], None
+        while True:
+            response = client.conversations_replies(channel=self.channel_id, ts=self.unix_timestamp, cursor=cursor)
+            replies += [reply for reply in response['messages'] if reply['ts'] != reply.get('thread_ts')]
+            cursor = response.get('response_metadata', {}).get('next_cursor')
+            if not cursor:
+                break
+
         for reply in replies:
             reply_time = datetime.utcfromtimestamp(float(reply['ts'])).strftime("%Y-%m-%d %H:%M:%S")
             reply_user = reply["user"]
             reply_text = reply["text"]
-            self.body += f'\nReply from {reply_user} at {reply_time}: {reply_text}'
+            self.body += f'{REPLY_PREFIX}{reply_user} at {reply_time}: {reply_text}'
 
 
 def test():
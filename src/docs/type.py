@@ -2,8 +2,8 @@ import hashlib
 import logging
 from abc import ABC, abstractmethod
 from datetime import datetime
-from functools import cached_property
-from typing import TYPE_CHECKING
+from functools import cached_property, lru_cache
+from typing import Sequence, TYPE_CHECKING
 
 import tiktoken
 
@@ -11,6 +11,12 @@ if TYPE_CHECKING:
     from src.config import Config
 
 
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """loading a tiktoken encoding is slow, so every model's encoding is loaded once and shared."""
+    return tiktoken.encoding_for_model(model)
+
+
 class Doc(ABC):
     def __init__(
             self,
@@ -33,7 +39,8 @@ class Doc(ABC):
         self.last_edited = last_edited
         self.last_scraped = last_scraped
         self.url = url
-        self.embedding: list[float] | None = None
+        self.embedding: Sequence[float] | None = None
+        self.token_counts: dict[tuple[str, str], int] = dict()  # (hash, model) -> number of tokens in str(self)
 
     def __str__(self):
         return '\n'.join([self.header, self.body])
@@ -42,11 +49,16 @@ class Doc(ABC):
     def hash(self) -> str:
         return hashlib.md5(str(self).encode()).hexdigest()
 
+    def reset_hash(self):
+        """the hash is cached, so it has to be reset when the header or body change."""
+        self.__dict__.pop('hash', None)
+
     def scrape(self, **kwargs):
         if self.is_scraped:
             return
         self._scrape(**kwargs)
         self.last_scraped = datetime.utcnow()
+        self.reset_hash()
 
     @abstractmethod
     def _scrape(self, **kwargs):
@@ -58,27 +70,31 @@ class Doc(ABC):
 
     @staticmethod
     def count_tokens(text: str, model: str):
-        encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(text))
+        return len(get_encoding(model).encode(text))
 
     def token_count(self, model: str):
-        return self.count_tokens(str(self), model)
+        key = (self.hash, model)
+        if key not in self.token_counts:
+            self.token_counts[key] = self.count_tokens(str(self), model)
+        return self.token_counts[key]
+
+    def set_token_count(self, model: str, token_count: int):
+        self.token_counts[(self.hash, model)] = token_count
 
     def split_into_segments(self, config: 'Config') -> list['Doc']:
         if not self.body:
             logging.warning(f"Cannot create segments for {self.url}. Body is empty.")
             return []
 
-        body_tokens = self.count_tokens(self.body, config.model_chat)
+        encoding = get_encoding(config.model_chat)
+        body_tokens = encoding.encode(self.body)
         header_tokens = self.count_tokens(self.header, config.model_chat)
         url_tokens = self.count_tokens(self.url, config.model_chat)
-        total_tokens = sum([body_tokens, header_tokens, url_tokens])
+        total_tokens = sum([len(body_tokens), header_tokens, url_tokens])
 
         if total_tokens <= config.doc_token_limit:
-            return [self]
+            return [self.segment(self.body)]
 
-        encoding = tiktoken.encoding_for_model(config.model_chat)
-        body_tokens = encoding.encode(self.body)
         max_body_tokens = config.doc_token_limit - header_tokens - url_tokens
 
         if max_body_tokens < 20:
@@ -96,20 +112,21 @@ class Doc(ABC):
 
         segments = [seg if i == 0 else '...' + seg for i, seg in enumerate(segments)]
         segments = [seg if i + 1 == len(segments) else seg + '...' for i, seg in enumerate(segments)]
-        segments = [
-            self.__class__(
-                body=seg,
-                header=self.header,
-                url=self.url,
-                last_edited=self.last_edited,
-                last_scraped=self.last_scraped
-            )
-            for seg in segments
-        ]
+        segments = [self.segment(seg) for seg in segments]
 
         return segments
 
-    def set_embedding(self, embedding: list[float]):
+    def segment(self, body: str) -> 'Doc':
+        """a copy of this doc with a different body."""
+        return self.__class__(
+            body=body,
+            header=self.header,
+            url=self.url,
+            last_edited=self.last_edited,
+            last_scraped=self.last_scraped
+        )
+
+    def set_embedding(self, embedding: Sequence[float] | None):
         self.embedding = embedding
 
     def save_to_dict(self) -> dict[str, str]:
@@ -131,3 +148,5 @@ class Doc(ABC):
         if doc.last_scraped > self.last_scraped:
             self.last_scraped = doc.last_scraped
             self.body = doc.body
+
+        self.reset_hash()
@@ -1,94 +1,277 @@
 from src.docs import Doc
-from src.retrievers import CombinedRetriever
-import json
+from src.embedding_store import EmbeddingStore
+from src.indexes import BM25Index, QueryFilter, TermCache, reciprocal_rank_fusion
+from src.metrics import metrics
+from src.query_embedding_cache import QueryEmbeddingCache
+from src.snapshot import IndexSnapshot
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
+import random
+import threading
+import time
+from datetime import datetime
+from functools import cached_property
 from tqdm import tqdm
 from typing import TYPE_CHECKING
-from openai import OpenAI
-import os
+from openai import OpenAI, APIConnectionError, InternalServerError, RateLimitError
 
 if TYPE_CHECKING:
     from src.config import Config
+    from src.retrievers import CombinedRetriever
 
 
 class DocSelector:
-    def __init__(self, config: 'Config'):
+    def __init__(self, config: 'Config', openai_client: OpenAI | None = None):
         self.config = config
-        self.openai_client = OpenAI(api_key=config.OPENAI_API_KEY, organization=config.OPENAI_ORG)
-        self.docs: list[Doc] = []
-        self.fetch_doc_embeddings()
+        # fetch_embeddings retries on its own, so the client must not retry as well
+        self.openai_client = openai_client or OpenAI(
+            api_key=config.OPENAI_API_KEY, organization=config.OPENAI_ORG, max_retries=0
+        )
+        self.embedding_store = EmbeddingStore(
+            file=config.file_embeddings,
+            checkpoint_size=config.embeddings_checkpoint_size,
+            checkpoint_seconds=config.embeddings_checkpoint_seconds,
+        )
+        self.query_embedding_cache = QueryEmbeddingCache(config)
+        self.refresh_lock = threading.Lock()  # only one refresh runs at a time
+        self.term_cache = TermCache() if config.retrieval == 'hybrid' else None
 
-        for doc in self.docs:
-            print(doc.header)
+        # answer queries from the last snapshot until the first refresh is done
+        with metrics.span('load_snapshot'):
+            self.snapshot = IndexSnapshot.load(config.file_snapshot, config, self.term_cache) or IndexSnapshot(
+                docs=[],
+                embedded_docs=[],
+                embeddings_matrix=np.empty((0, 0), dtype=np.float32),
+                token_counts=np.empty(0, dtype=np.int64),
+                vector_index=config.get_vector_index(),
+                created_at=0,
+            )
+
+    @cached_property
+    def retriever(self) -> 'CombinedRetriever':
+        """created on the first refresh, since it scrapes all docs if they haven't been cached yet."""
+        from src.retrievers import CombinedRetriever
+        return CombinedRetriever(config=self.config)
+
+    @property
+    def is_ready(self) -> bool:
+        """whether there are docs to answer queries with."""
+        return bool(self.snapshot.embedded_docs)
 
     def __call__(self, query: str) -> list[Doc]:
-        query_embedding = self.fetch_embedding(query)
-        query_vector = np.asarray(query_embedding)
-        query_vector_norm = query_embedding / np.linalg.norm(query_vector)
+        return self.select(self.embed_query(query), query)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """the L2-normalized embedding of a query."""
+        with metrics.span('query_embedding'):
+            query_vector = self.query_embedding_cache.get(query)
+            if query_vector is None:
+                query_vector = np.asarray(self.fetch_embedding(query), dtype=np.float32)
+                query_vector = query_vector / np.linalg.norm(query_vector)
+                self.query_embedding_cache.add(query, query_vector)
+            return query_vector
+
+    @property
+    def docs(self) -> tuple[Doc, ...]:
+        return self.snapshot.docs
+
+    @property
+    def embedded_docs(self) -> tuple[Doc, ...]:
+        return self.snapshot.embedded_docs
+
+    def select(self, query_vector: np.ndarray, query: str | None = None) -> list[Doc]:
+        """the docs most similar to the query that fit in the token limit.
+        with hybrid retrieval, the query text is also matched with the words in the docs.
+        channels, sources and periods that are mentioned in the query restrict which docs are searched."""
+        snapshot = self.snapshot  # a refresh may swap in a new snapshot while the query runs
+        assert snapshot.docs, 'no docs retrieved'
+        assert snapshot.embedded_docs, 'no docs with embeddings retrieved'
+
+        mask = self.filter_mask(snapshot, query)
+        bias = None
+        if self.config.recency_half_life_days > 0:
+            bias = self.config.recency_weight * snapshot.metadata_index.recency(
+                datetime.utcnow(), self.config.recency_half_life_days
+            )
+
+        # retrieve the top k docs, and widen k until the docs that fit in the token limit are found
+        n_docs = len(snapshot.embedded_docs) if mask is None else int(np.count_nonzero(mask))
+        with metrics.span('similarity_search', segments=len(snapshot.embedded_docs), candidates=n_docs):
+            token_limit = self.config.openai_token_limit
+            k = min(n_docs, 2 * token_limit // max(1, int(np.mean(snapshot.token_counts))) + 1)
+            while True:
+                rows = self.search(snapshot, query_vector, query, k, mask, bias)
+                n_selected = np.searchsorted(np.cumsum(snapshot.token_counts[rows]), token_limit, side='right')
+                if n_selected < len(rows) or len(rows) < k or k == n_docs:
+                    break
+                k = min(n_docs, 4 * k)
+
+        return [snapshot.embedded_docs[i] for i in rows[:n_selected]]
 
-        assert self.docs, 'no docs retrieved'
-        docs = [doc for doc in self.docs if doc.embedding]
-        assert docs, 'no docs with embeddings retrieved'
+    def filter_mask(self, snapshot: IndexSnapshot, query: str | None) -> np.ndarray | None:
+        """which docs match the filters in the query, or None to search all docs.
+        if no doc matches, all docs are searched rather than answering without docs."""
+        if query is None or self.config.query_filters == 'off':
+            return None
+        query_filter = QueryFilter.from_query(query)
+        if query_filter.is_empty:
+            return None
 
-        embeddings_matrix = np.asarray([doc.embedding for doc in docs])
-        embeddings_matrix_norm = embeddings_matrix / np.linalg.norm(embeddings_matrix, axis=1, keepdims=True)
-        similarities = embeddings_matrix_norm.dot(query_vector_norm)
+        mask = snapshot.metadata_index.mask(query_filter)
+        matched = mask.any()
+        metrics.increment('query_filters_total', result='matched' if matched else 'no_match')
+        return mask if matched else None
 
-        selected_docs = []
-        token_count = 0
+    def search(
+            self,
+            snapshot: IndexSnapshot,
+            query_vector: np.ndarray,
+            query: str | None,
+            k: int,
+            mask: np.ndarray | None = None,
+            bias: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """rows of the best matching docs, best first. hybrid retrieval fuses the k most similar docs and the k best
+        lexical matches, so it can return up to 2k rows."""
+        rows, _ = snapshot.vector_index.search(query_vector, k=k, mask=mask, bias=bias)
+        if snapshot.lexical_index is None or query is None:
+            return rows
+        lexical_rows, _ = snapshot.lexical_index.search(query, k=k, mask=mask)
+        return reciprocal_rank_fusion([rows, lexical_rows], k=self.config.rrf_k)
 
-        for i in np.argsort(similarities)[::-1]:
-            doc = docs[i]
-            token_count += doc.token_count(self.config.model_chat)
-            if token_count > self.config.openai_token_limit:
-                break
-            selected_docs.append(doc)
+    @metrics.timed('refresh.build_index')
+    def build_snapshot(self, docs: list[Doc]) -> IndexSnapshot:
+        """stack the embeddings of all docs into one contiguous, L2-normalized float32 matrix and index it.
+        the matrix and index of the current snapshot are reused if the set of embedded docs didn't change."""
+        embedded_docs = [doc for doc in docs if doc.embedding is not None]
+        hashes = [doc.hash for doc in embedded_docs]
+        current = self.snapshot
 
-        return selected_docs
+        if hashes == current.hashes:
+            return IndexSnapshot(
+                docs=docs,
+                embedded_docs=embedded_docs,
+                embeddings_matrix=current.embeddings_matrix,
+                token_counts=current.token_counts,
+                vector_index=current.vector_index,
+                lexical_index=current.lexical_index,
+                metadata_index=current.metadata_index,
+            )
 
-    def load_docs_from_data(self):
-        """read docs and embeddings from files. split the docs and assign embeddings to docs."""
-        retriever = CombinedRetriever(config=self.config)
-        self.docs = retriever.segments
-        embeddings_cache = self.load_embeddings_cache()
+        if embedded_docs:
+            matrix = np.asarray([doc.embedding for doc in embedded_docs], dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            matrix /= norms
+            matrix = np.ascontiguousarray(matrix)
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
 
-        for doc in self.docs:
-            embedding = embeddings_cache.get(doc.hash)
-            doc.set_embedding(embedding)
+        token_counts = np.fromiter(
+            (doc.token_count(self.config.model_chat) for doc in embedded_docs), dtype=np.int64, count=len(embedded_docs)
+        )
+
+        vector_index = self.config.get_vector_index()
+        vector_index.build(matrix, hashes)
+        vector_index.save()
+
+        lexical_index = None
+        if self.term_cache is not None:
+            lexical_index = BM25Index(self.term_cache)
+            lexical_index.build([str(doc) for doc in embedded_docs], hashes)
+            self.term_cache.prune(set(hashes))
+
+        return IndexSnapshot(
+            docs=docs,
+            embedded_docs=embedded_docs,
+            embeddings_matrix=matrix,
+            token_counts=token_counts,
+            vector_index=vector_index,
+            lexical_index=lexical_index,
+        )
 
     def refresh_data(self):
-        retriever = CombinedRetriever(self.config)
-        retriever.scrape_docs()
-        self.fetch_doc_embeddings()
+        with metrics.span('refresh'):
+            with self.refresh_lock:
+                with metrics.span('refresh.scrape_docs'):
+                    self.retriever.scrape_docs()
+                self._refresh_snapshot()
+            self.query_embedding_cache.checkpoint()
 
     def fetch_doc_embeddings(self):
-        self.load_docs_from_data()
-        embeddings_cache = self.load_embeddings_cache()
-        docs_without_embeddings = [doc for doc in self.docs if doc.hash not in embeddings_cache]
+        with self.refresh_lock:
+            self._refresh_snapshot()
+
+    def _refresh_snapshot(self):
+        """split the docs into segments, embed the new ones and swap in a snapshot of them."""
+        with metrics.span('refresh.load_docs'):
+            docs = self.retriever.segments
+        with metrics.span('refresh.fetch_embeddings'):
+            self._fetch_missing_embeddings(docs)
+
+        snapshot = self.build_snapshot(docs)
+        if snapshot.embedded_docs and snapshot.embeddings_matrix is not self.snapshot.embeddings_matrix:
+            with metrics.span('refresh.save_snapshot'):
+                snapshot.save(self.config.file_snapshot)
+        self.snapshot = snapshot
+
+    def _fetch_missing_embeddings(self, docs: list[Doc]):
+        texts = {doc.hash: str(doc) for doc in docs if doc.hash not in self.embedding_store}
+        items = list(texts.items())
+        batch_size = self.config.embeddings_batch_size  # azure only accepts one input per request
+        batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+        executor = ThreadPoolExecutor(max_workers=self.config.embeddings_workers)
+        try:
+            futures = {executor.submit(self.fetch_embeddings, [text for _, text in batch]): batch for batch in batches}
+            with tqdm(total=len(items), desc='Fetching Embeddings', disable=not items) as progress:
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    self.embedding_store.add_many(zip([doc_hash for doc_hash, _ in batch], future.result()))
+                    progress.update(len(batch))
+        finally:
+            executor.shutdown(cancel_futures=True)
+            # fetched embeddings survive an interrupted refresh, which then resumes where it stopped
+            self.embedding_store.checkpoint()
+
+        # drop embeddings of docs that no longer exist once they make up most of the store
+        doc_hashes = {doc.hash for doc in docs}
+        if len(self.embedding_store) > 2 * len(doc_hashes):
+            self.embedding_store.compact(keep=doc_hashes)
 
-        for doc in tqdm(docs_without_embeddings, desc='Fetching Embeddings', disable=not docs_without_embeddings):
-            if doc.hash in embeddings_cache:
-                continue
-            embeddings_cache[doc.hash] = self.fetch_embedding(str(doc))  # batching doesn't work with azure
-            self.save_embeddings_cache(embeddings_cache)
+        for doc in docs:
+            doc.set_embedding(self.embedding_store.get(doc.hash))
 
     def fetch_embedding(self, text: str):
-        text = text.replace("\n", " ").strip()
-        return self.openai_client.embeddings.create(input=[text], model=self.config.model_embeddings).data[0].embedding
+        return self.fetch_embeddings([text])[0]
 
-    def save_embeddings_cache(self, cache: dict[str, list[float]]):
-        directory = os.path.dirname(self.config.file_embeddings)
-        if directory:
-            os.makedirs(directory, exist_ok=True)
+    def fetch_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """embed texts in one request. retries with exponential backoff when rate limited."""
+        texts = [text.replace("\n", " ").strip() for text in texts]
+        max_retries = self.config.embeddings_max_retries
 
-        with open(self.config.file_embeddings, 'w') as f:
-            json.dump(cache, f)
+        for attempt in range(max_retries + 1):
+            try:
+                metrics.increment('openai_api_calls_total', api='embeddings')
+                response = self.openai_client.embeddings.create(input=texts, model=self.config.model_embeddings)
+                usage = getattr(response, 'usage', None)
+                if usage is not None:
+                    metrics.increment('openai_tokens_total', usage.total_tokens, api='embeddings', type='prompt')
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            except (RateLimitError, APIConnectionError, InternalServerError) as e:
+                if attempt == max_retries:
+                    raise
+                time.sleep(self.retry_delay(e, attempt))
 
-    def load_embeddings_cache(self) -> dict[str, list[float]]:
-        if not os.path.exists(self.config.file_embeddings):
-            return dict()
-        with open(self.config.file_embeddings) as json_file:
-            return json.load(json_file)
+    @staticmethod
+    def retry_delay(error: Exception, attempt: int) -> float:
+        """seconds to wait before the next attempt. uses the retry-after header if the api sent one."""
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return 2 ** attempt + random.random()
 
 
 def test():
@@ -96,6 +279,7 @@ def test():
     config = Config()
 
     selector = DocSelector(config)
+    selector.fetch_doc_embeddings()
 
     docs = selector('Unlimited Time Off')
     print('\n\n\n'.join([str(doc) for doc in docs]))
@@ -0,0 +1,185 @@
+import json
+import os
+import time
+from typing import Iterable, Sequence
+
+import numpy as np
+
+HEADER_SIZE = 16
+MAGIC = b'EMBSTOR1'
+HASH_SIZE = 32  # md5 hexdigest of a doc
+
+
+class EmbeddingStore:
+    def __init__(self, file: str, checkpoint_size: int = 100, checkpoint_seconds: float = 30):
+        """stores embeddings in a binary file that is opened with memory mapping.
+        the file has a small header with the embedding dimension, followed by fixed size records of
+        (doc hash, float32 vector). new embeddings are buffered and appended to the file in checkpoints
+        of checkpoint_size embeddings or every checkpoint_seconds, whichever comes first.
+        a file in the old json format is migrated to a .bin file next to it."""
+        if file.endswith('.json'):
+            file = os.path.splitext(file)[0] + '.bin'
+        self.file = file
+        self.file_legacy_json = os.path.splitext(file)[0] + '.json'
+        self.checkpoint_size = checkpoint_size
+        self.checkpoint_seconds = checkpoint_seconds
+
+        self.rows: dict[str, int] = dict()
+        self.dim: int | None = None
+        self._records: np.memmap | None = None
+        self._n_persisted = 0
+        self._pending: list[tuple[str, np.ndarray]] = []
+        self._last_checkpoint = time.monotonic()
+
+        if not os.path.exists(self.file) and os.path.exists(self.file_legacy_json):
+            self.migrate_from_json(self.file_legacy_json)
+        self.load()
+
+    def __contains__(self, doc_hash: str) -> bool:
+        return doc_hash in self.rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def record_dtype(self) -> np.dtype:
+        return np.dtype([('hash', f'S{HASH_SIZE}'), ('vector', '<f4', (self.dim,))])
+
+    @property
+    def persisted_vectors(self) -> np.ndarray:
+        """memory mapped (read-only) matrix with all embeddings that are written to the file."""
+        if self._records is None and self._n_persisted:
+            self._records = np.memmap(
+                self.file, dtype=self.record_dtype, mode='r', offset=HEADER_SIZE, shape=(self._n_persisted,)
+            )
+        if self._records is None:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return self._records['vector']
+
+    def get(self, doc_hash: str) -> np.ndarray | None:
+        row = self.rows.get(doc_hash)
+        if row is None:
+            return None
+        if row >= self._n_persisted:
+            return self._pending[row - self._n_persisted][1]
+        return self.persisted_vectors[row]
+
+    def add(self, doc_hash: str, embedding: Sequence[float]) -> None:
+        self.add_many([(doc_hash, embedding)])
+
+    def add_many(self, items: Iterable[tuple[str, Sequence[float]]]) -> None:
+        for doc_hash, embedding in items:
+            if doc_hash in self.rows:
+                continue
+            if len(doc_hash) != HASH_SIZE:
+                raise ValueError(f'hash {doc_hash} should have {HASH_SIZE} characters.')
+            vector = np.asarray(embedding, dtype=np.float32)
+            if self.dim is None:
+                self.dim = len(vector)
+            if vector.shape != (self.dim,):
+                raise ValueError(f'embedding has shape {vector.shape}, expected ({self.dim},).')
+            self.rows[doc_hash] = len(self.rows)
+            self._pending.append((doc_hash, vector))
+
+        checkpoint_due = time.monotonic() - self._last_checkpoint >= self.checkpoint_seconds
+        if len(self._pending) >= self.checkpoint_size or (self._pending and checkpoint_due):
+            self.checkpoint()
+
+    def checkpoint(self):
+        """append all buffered embeddings to the file and flush them to disk."""
+        self._last_checkpoint = time.monotonic()
+        if not self._pending:
+            return
+
+        # a file without records may have a header without a dimension (e.g. after migrating an empty cache)
+        if not os.path.exists(self.file) or not self._n_persisted:
+            directory = os.path.dirname(self.file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.file, 'wb') as f:
+                f.write(self.header())
+
+        with open(self.file, 'ab') as f:
+            f.write(self.to_records(self._pending).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._n_persisted += len(self._pending)
+        self._pending = []
+        self._records = None  # remap on next access to include the new rows
+
+    def compact(self, keep: set[str]):
+        """rewrite the file with only the embeddings in keep. the file is replaced atomically."""
+        self.checkpoint()
+        hashes = [doc_hash for doc_hash in self.rows if doc_hash in keep]
+        if len(hashes) == len(self.rows):
+            return
+        self.write_atomic([(doc_hash, self.get(doc_hash)) for doc_hash in hashes])
+        self.load()
+
+    def to_records(self, items: list[tuple[str, np.ndarray]]) -> np.ndarray:
+        records = np.empty(len(items), dtype=self.record_dtype)
+        records['hash'] = [doc_hash.encode() for doc_hash, _ in items]
+        records['vector'] = [vector for _, vector in items]
+        return records
+
+    def write_atomic(self, items: list[tuple[str, np.ndarray]]):
+        """write a complete file next to the store and swap it in, so a crash never leaves a partial file."""
+        directory = os.path.dirname(self.file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_file = self.file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(self.header())
+            if items:
+                f.write(self.to_records(items).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.file)
+
+    def header(self) -> bytes:
+        return MAGIC + np.uint64(self.dim or 0).tobytes()
+
+    def load(self):
+        self.rows = dict()
+        self.dim = None
+        self._records = None
+        self._n_persisted = 0
+        self._pending = []
+
+        if not os.path.exists(self.file):
+            return
+
+        with open(self.file, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{self.file} is not an embeddings file.')
+        self.dim = int(np.frombuffer(header[len(MAGIC):], dtype=np.uint64)[0]) or None
+        if self.dim is None:
+            return
+
+        # a crash during a checkpoint can leave a partially written record at the end of the file
+        data_size = os.path.getsize(self.file) - HEADER_SIZE
+        n_records, torn_bytes = divmod(data_size, self.record_dtype.itemsize)
+        if torn_bytes:
+            print(f'Discarding a partially written embedding at the end of {self.file}.')
+            with open(self.file, 'r+b') as f:
+                f.truncate(HEADER_SIZE + n_records * self.record_dtype.itemsize)
+        if not n_records:
+            return
+
+        records = np.memmap(self.file, dtype=self.record_dtype, mode='r', offset=HEADER_SIZE, shape=(n_records,))
+        self.rows = {doc_hash.decode(): i for i, doc_hash in enumerate(records['hash'])}
+        self._records = records
+        self._n_persisted = n_records
+
+    def migrate_from_json(self, file_json: str):
+        """one-time import of the old embeddings.json format ({hash: [floats]})."""
+        print(f'Migrating embeddings from {file_json} to {self.file}...')
+        with open(file_json) as f:
+            cache: dict[str, list[float]] = json.load(f)
+        items = [(doc_hash, np.asarray(embedding, dtype=np.float32)) for doc_hash, embedding in cache.items()]
+        if items:
+            self.dim = len(items[0][1])
+        self.write_atomic(items)
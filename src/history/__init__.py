@@ -0,0 +1,3 @@
+from src.history.type import HistoryStore
+from src.history.memory import MemoryHistoryStore
+from src.history.sqlite import SQLiteHistoryStore
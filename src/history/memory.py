@@ -0,0 +1,33 @@
+import threading
+from collections import deque
+from typing import TYPE_CHECKING
+
+from src.history.type import HistoryStore
+
+if TYPE_CHECKING:
+    from src.config import Config
+
+
+class MemoryHistoryStore(HistoryStore):
+    def __init__(self, config: 'Config'):
+        """keeps the messages of every user in a ring buffer in memory."""
+        super().__init__(config)
+        self.messages: dict[str, deque[dict[str, str]]] = dict()
+        self.last_active: dict[str, float] = dict()
+        self.lock = threading.Lock()
+
+    def _append(self, user_id: str, message: dict[str, str], timestamp: float):
+        with self.lock:
+            if user_id not in self.messages:
+                self.messages[user_id] = deque(maxlen=self.max_messages)
+            self.messages[user_id].append(message)
+            self.last_active[user_id] = timestamp
+
+    def get(self, user_id: str) -> list[dict[str, str]]:
+        with self.lock:
+            return list(self.messages.get(user_id, ()))
+
+    def evict_idle(self, before: float):
+        with self.lock:
+            for user_id in [user_id for user_id, timestamp in self.last_active.items() if timestamp < before]:
+                del self.messages[user_id], self.last_active[user_id]
@@ -0,0 +1,57 @@
+import os
+import sqlite3
+import threading
+from typing import TYPE_CHECKING
+
+from src.history.type import HistoryStore
+
+if TYPE_CHECKING:
+    from src.config import Config
+
+
+class SQLiteHistoryStore(HistoryStore):
+    def __init__(self, config: 'Config'):
+        """keeps the messages of every user in a SQLite database, so they survive restarts."""
+        super().__init__(config)
+        directory = os.path.dirname(config.file_history)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(config.file_history, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS messages ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, role TEXT NOT NULL, '
+                'content TEXT NOT NULL, timestamp REAL NOT NULL)'
+            )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS messages_user_id ON messages (user_id, id)')
+
+    def _append(self, user_id: str, message: dict[str, str], timestamp: float):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT INTO messages (user_id, role, content, timestamp) VALUES (?, ?, ?, ?)',
+                (user_id, message['role'], message['content'], timestamp),
+            )
+            self.connection.execute(
+                'DELETE FROM messages WHERE user_id = ? AND id <= '
+                '(SELECT id FROM messages WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)',
+                (user_id, user_id, self.max_messages),
+            )
+
+    def get(self, user_id: str) -> list[dict[str, str]]:
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT role, content FROM messages WHERE user_id = ? ORDER BY id DESC LIMIT ?',
+                (user_id, self.max_messages),
+            ).fetchall()
+        return [{'role': role, 'content': content} for role, content in reversed(rows)]
+
+    def evict_idle(self, before: float):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'DELETE FROM messages WHERE user_id IN '
+                '(SELECT user_id FROM messages GROUP BY user_id HAVING MAX(timestamp) < ?)',
+                (before,),
+            )
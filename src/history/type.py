@@ -0,0 +1,34 @@
+import time
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.config import Config
+
+
+class HistoryStore(ABC):
+    def __init__(self, config: 'Config'):
+        """keeps the last history_length messages of every user.
+        users that haven't sent a message in history_idle_minutes are forgotten."""
+        self.max_messages = config.history_length
+        self.idle_seconds = config.history_idle_minutes * 60
+        self.eviction_interval = 60
+        self.last_eviction = time.monotonic()
+
+    def append(self, user_id: str, role: str, content: str):
+        self._append(user_id, {'role': role, 'content': content}, time.time())
+        if time.monotonic() - self.last_eviction >= self.eviction_interval:
+            self.last_eviction = time.monotonic()
+            self.evict_idle(time.time() - self.idle_seconds)
+
+    @abstractmethod
+    def _append(self, user_id: str, message: dict[str, str], timestamp: float):
+        """add a message and drop the oldest messages of the user if there are more than max_messages."""
+
+    @abstractmethod
+    def get(self, user_id: str) -> list[dict[str, str]]:
+        """the messages of a user, oldest first."""
+
+    @abstractmethod
+    def evict_idle(self, before: float):
+        """forget the users whose last message is older than the timestamp before."""
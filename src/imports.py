@@ -0,0 +1,22 @@
+import sys
+from importlib import import_module
+from typing import Callable
+
+
+def import_class(path: str) -> type:
+    """import a class from its dotted path, e.g. 'src.indexes.ivf.IVFIndex'."""
+    module, name = path.rsplit('.', 1)
+    return getattr(import_module(module), name)
+
+
+def lazy_exports(package: str, modules: dict[str, str]) -> Callable[[str], object]:
+    """a module __getattr__ for a package that exports names from its modules. a module is only imported when one
+    of its names is used, so e.g. the cli doesn't import slack_sdk. modules maps names to the module they are from."""
+    def __getattr__(name: str):
+        if name not in modules:
+            raise AttributeError(f'module {package!r} has no attribute {name!r}')
+        value = import_class(f'{modules[name]}.{name}')
+        setattr(sys.modules[package], name, value)  # later lookups don't go through __getattr__
+        return value
+
+    return __getattr__
@@ -0,0 +1,13 @@
+from src.imports import lazy_exports
+
+# indexes are imported when they are used, so only the configured vector index is loaded
+__getattr__ = lazy_exports(__name__, {
+    'VectorIndex': 'src.indexes.type',
+    'BruteForceIndex': 'src.indexes.brute_force',
+    'IVFIndex': 'src.indexes.ivf',
+    'BM25Index': 'src.indexes.bm25',
+    'TermCache': 'src.indexes.bm25',
+    'reciprocal_rank_fusion': 'src.indexes.fusion',
+    'MetadataIndex': 'src.indexes.metadata',
+    'QueryFilter': 'src.indexes.metadata',
+})
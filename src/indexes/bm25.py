@@ -0,0 +1,123 @@
+import re
+import threading
+from collections import Counter
+from typing import BinaryIO
+
+import numpy as np
+
+from src.indexes.type import VectorIndex
+
+TOKEN_PATTERN = re.compile(r'\w+(?:[-.:/]\w+)*')
+
+
+def tokenize(text: str) -> list[str]:
+    """lowercase words. identifiers like INC-1234 or eng-oncall are kept whole and also split into their parts."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens += re.findall(r'[^\W_]+', token)
+    return tokens
+
+
+class TermCache:
+    def __init__(self):
+        """term ids and term counts of every doc, keyed by doc hash, so docs are only tokenized once.
+        it is shared by the BM25 indexes of consecutive refreshes. term ids never change."""
+        self.vocabulary: dict[str, int] = dict()
+        self.terms: dict[str, tuple[np.ndarray, np.ndarray]] = dict()  # doc hash -> (term ids, counts)
+        self.lock = threading.Lock()
+
+    def get(self, doc_hash: str, text: str) -> tuple[np.ndarray, np.ndarray]:
+        if doc_hash not in self.terms:
+            counts = Counter(tokenize(text))
+            with self.lock:
+                ids = np.fromiter(
+                    (self.vocabulary.setdefault(token, len(self.vocabulary)) for token in counts),
+                    dtype=np.int64, count=len(counts),
+                )
+            self.terms[doc_hash] = ids, np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+        return self.terms[doc_hash]
+
+    def prune(self, keep: set[str]):
+        """forget the terms of docs that no longer exist."""
+        self.terms = {doc_hash: terms for doc_hash, terms in self.terms.items() if doc_hash in keep}
+
+
+class BM25Index:
+    def __init__(self, term_cache: TermCache | None = None, k1: float = 1.2, b: float = 0.75):
+        """lexical search with an inverted index and BM25 scoring. finds docs that contain the exact words of a
+        query, e.g. ticket numbers, channel names or error messages, which embeddings often miss."""
+        self.term_cache = term_cache or TermCache()
+        self.k1 = k1
+        self.b = b
+
+        # the postings of term i are rows[offsets[i]:offsets[i + 1]] with the term counts in counts
+        self.rows = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.float32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_lengths = np.empty(0, dtype=np.float32)
+        self.n_docs = 0
+
+    def build(self, texts: list[str], hashes: list[str]):
+        """index the docs. hashes[i] is the hash of texts[i]."""
+        terms = [self.term_cache.get(doc_hash, text) for doc_hash, text in zip(hashes, texts)]
+        self.n_docs = len(terms)
+        n_terms = len(self.term_cache.vocabulary)
+        if not terms:
+            return
+
+        term_ids = np.concatenate([ids for ids, _ in terms])
+        counts = np.concatenate([term_counts for _, term_counts in terms])
+        rows = np.repeat(np.arange(len(terms)), [len(ids) for ids, _ in terms])
+        self.doc_lengths = np.bincount(rows, weights=counts, minlength=len(terms)).astype(np.float32)
+
+        order = np.argsort(term_ids, kind='stable')
+        self.rows = rows[order]
+        self.counts = counts[order].astype(np.float32)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(term_ids, minlength=n_terms))])
+
+    def save(self, file: str | BinaryIO):
+        vocabulary = np.array(list(self.term_cache.vocabulary)[:len(self.offsets) - 1], dtype=str)
+        np.savez(
+            file, rows=self.rows, counts=self.counts, offsets=self.offsets, doc_lengths=self.doc_lengths,
+            vocabulary=vocabulary,
+        )
+
+    def load(self, file: str):
+        """load an index that was saved with save(), so it does not need to tokenize the docs again.
+        the term cache must be new, since the saved term ids replace its vocabulary."""
+        with np.load(file) as data:
+            self.rows = data['rows']
+            self.counts = data['counts']
+            self.offsets = data['offsets']
+            self.doc_lengths = data['doc_lengths']
+            self.term_cache.vocabulary = {token: i for i, token in enumerate(data['vocabulary'].tolist())}
+        self.n_docs = len(self.doc_lengths)
+
+    def search(self, query: str, k: int, mask: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """return the rows of (at most) the k best matching docs and their scores, best first.
+        only rows where mask is True are searched."""
+        n_terms = len(self.offsets) - 1
+        vocabulary = self.term_cache.vocabulary
+        term_ids = {vocabulary.get(token, n_terms) for token in tokenize(query)}
+        term_ids = [term_id for term_id in term_ids if term_id < n_terms]
+        if not term_ids or not self.n_docs:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / self.doc_lengths.mean())
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            if start == end:
+                continue
+            rows, counts = self.rows[start:end], self.counts[start:end]
+            idf = np.log(1 + (self.n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            if mask is not None:
+                matching = mask[rows]
+                rows, counts = rows[matching], counts[matching]
+            scores[rows] += idf * counts * (self.k1 + 1) / (counts + length_norm[rows])
+
+        matches = np.flatnonzero(scores)
+        top = VectorIndex.top_k(scores[matches], k)
+        return matches[top], scores[matches[top]]
@@ -0,0 +1,26 @@
+import numpy as np
+
+from src.indexes.type import VectorIndex
+
+
+class BruteForceIndex(VectorIndex):
+    """exact search: compares the query with every row of the embeddings matrix."""
+
+    def build(self, matrix: np.ndarray, hashes: list[str]):
+        self.matrix = matrix
+
+    def search(
+            self, query_vector: np.ndarray, k: int, mask: np.ndarray | None = None, bias: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if mask is None:
+            similarities = self.matrix @ query_vector
+            candidates = None
+        else:
+            candidates = np.flatnonzero(mask)
+            similarities = self.matrix[candidates] @ query_vector
+        if bias is not None:
+            similarities += bias if candidates is None else bias[candidates]
+
+        top = self.top_k(similarities, k)
+        rows = top if candidates is None else candidates[top]
+        return rows, similarities[top]
@@ -0,0 +1,13 @@
+import numpy as np
+
+
+def reciprocal_rank_fusion(rankings: list[np.ndarray], k: int = 60) -> np.ndarray:
+    """combine rankings of rows (best first) into one ranking. every ranking adds 1 / (k + rank) to the score of
+    a row, so rows that rank well in several rankings come first, without comparing their scores."""
+    rows = np.concatenate(rankings)
+    if not len(rows):
+        return rows
+    scores = np.concatenate([1 / (k + np.arange(1, len(ranking) + 1)) for ranking in rankings])
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    fused = np.bincount(inverse, weights=scores)
+    return unique_rows[np.argsort(-fused, kind='stable')]
@@ -0,0 +1,137 @@
+import os
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from src.indexes.type import VectorIndex
+
+if TYPE_CHECKING:
+    from src.config import Config
+
+
+class IVFIndex(VectorIndex):
+    def __init__(self, config: 'Config'):
+        """approximate search with an inverted file index. the embeddings are clustered with k-means and every doc
+        is assigned to its closest cluster (list). a query is only compared with the docs in the ivf_probes lists
+        whose centroids are closest to it.
+        centroids and the list of every doc hash are persisted, so new docs are assigned to a list without
+        retraining. the index is retrained once the corpus has grown to retrain_factor times its training size."""
+        super().__init__(config)
+        self.file = config.file_vector_index
+        self.probes = config.ivf_probes
+        self.retrain_factor = 4
+        self.kmeans_iterations = 10
+        self.kmeans_sample_per_list = 64
+
+        self.centroids = np.empty((0, 0), dtype=np.float32)
+        self.trained_size = 0
+        self.hash_to_list: dict[str, int] = dict()
+        self.load()
+
+        # the rows of list i are rows_by_list[list_bounds[i]:list_bounds[i + 1]]
+        self.rows_by_list = np.empty(0, dtype=np.int64)
+        self.list_bounds = np.zeros(1, dtype=np.int64)
+
+    def build(self, matrix: np.ndarray, hashes: list[str]):
+        self.matrix = matrix
+        if not len(matrix):
+            return
+
+        needs_training = (
+            not len(self.centroids)
+            or self.centroids.shape[1] != matrix.shape[1]
+            or len(matrix) > self.retrain_factor * self.trained_size
+        )
+        if needs_training:
+            self.train(matrix)
+
+        lists = np.fromiter(
+            (self.hash_to_list.get(doc_hash, -1) for doc_hash in hashes), dtype=np.int64, count=len(hashes)
+        )
+        new_rows = np.flatnonzero(lists < 0)
+        if len(new_rows):
+            lists[new_rows] = self.assign(matrix[new_rows])
+        self.hash_to_list = dict(zip(hashes, lists.tolist()))
+
+        self.rows_by_list = np.argsort(lists, kind='stable')
+        self.list_bounds = np.searchsorted(lists[self.rows_by_list], np.arange(len(self.centroids) + 1))
+
+    def train(self, matrix: np.ndarray):
+        """spherical k-means on a sample of the embeddings."""
+        n_lists = max(1, int(np.sqrt(len(matrix))))
+        rng = np.random.default_rng(0)
+        sample_size = min(len(matrix), n_lists * self.kmeans_sample_per_list)
+        sample = matrix[np.sort(rng.choice(len(matrix), size=sample_size, replace=False))]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+        for _ in range(self.kmeans_iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            non_empty = np.linalg.norm(sums, axis=1) > 0  # empty clusters keep their old centroid
+            centroids[non_empty] = sums[non_empty] / np.linalg.norm(sums[non_empty], axis=1, keepdims=True)
+
+        self.centroids = centroids
+        self.trained_size = len(matrix)
+        self.hash_to_list = dict()
+
+    def assign(self, vectors: np.ndarray, chunk_size: int = 10_000) -> np.ndarray:
+        """index of the closest centroid for every vector."""
+        return np.concatenate([
+            np.argmax(vectors[i:i + chunk_size] @ self.centroids.T, axis=1)
+            for i in range(0, len(vectors), chunk_size)
+        ])
+
+    def search(
+            self, query_vector: np.ndarray, k: int, mask: np.ndarray | None = None, bias: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if not len(self.matrix):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if mask is not None and np.count_nonzero(mask) <= self.probes * len(self.matrix) / len(self.centroids):
+            # fewer docs match than the probed lists would hold, so compare the query with all of them
+            candidates = np.flatnonzero(mask)
+        else:
+            # probe the closest lists, and more if they don't hold k (matching) docs
+            candidates, n_candidates = [], 0
+            for i, list_id in enumerate(np.argsort(self.centroids @ query_vector)[::-1]):
+                if i >= self.probes and n_candidates >= k:
+                    break
+                rows = self.rows_by_list[self.list_bounds[list_id]:self.list_bounds[list_id + 1]]
+                if mask is not None:
+                    rows = rows[mask[rows]]
+                candidates.append(rows)
+                n_candidates += len(rows)
+            candidates = np.concatenate(candidates)
+
+        similarities = self.matrix[candidates] @ query_vector
+        if bias is not None:
+            similarities += bias[candidates]
+        top = self.top_k(similarities, k)
+        return candidates[top], similarities[top]
+
+    def save(self):
+        if not len(self.centroids):
+            return
+        directory = os.path.dirname(self.file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_file = self.file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                trained_size=self.trained_size,
+                hashes=np.array(list(self.hash_to_list), dtype='S32'),
+                lists=np.fromiter(self.hash_to_list.values(), dtype=np.int32, count=len(self.hash_to_list)),
+            )
+        os.replace(tmp_file, self.file)
+
+    def load(self):
+        if not os.path.exists(self.file):
+            return
+        with np.load(self.file) as data:
+            self.centroids = data['centroids']
+            self.trained_size = int(data['trained_size'])
+            self.hash_to_list = dict(zip((h.decode() for h in data['hashes']), data['lists'].tolist()))
@@ -0,0 +1,122 @@
+import re
+from datetime import datetime, timedelta
+from typing import Sequence, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from src.docs import Doc
+
+EPOCH = datetime(1970, 1, 1)  # doc timestamps are naive utc datetimes
+SOURCES = {'slack': 'SlackConvo', 'notion': 'NotionPage'}
+CHANNEL_PATTERN = re.compile(r'(?<![\w&/])#([\w-]+)')
+# 'from slack' is left out, since it mostly names a topic (e.g. 'notifications from slack')
+SOURCE_PATTERN = re.compile(r'\b(?:in|on) (slack|notion)\b')
+HEADER_CHANNEL_PATTERN = re.compile(r'Slack message in #(\S+)')
+UNITS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+PERIOD_PATTERN = re.compile(r'\b(?:last|past) (?:(\d+) )?(day|week|month|year)s?\b')
+CALENDAR_PATTERN = re.compile(r'\b(yesterday|today|this week|this month|this year)\b')
+
+
+def to_timestamp(dt: datetime) -> float:
+    return (dt - EPOCH).total_seconds()
+
+
+class QueryFilter:
+    def __init__(
+            self,
+            sources: set[str] | None = None,
+            channels: set[str] | None = None,
+            after: datetime | None = None,
+            before: datetime | None = None,
+    ):
+        """restricts which docs a query is answered from. sources are doc type names, channels are slack channel
+        names or ids. times are naive utc datetimes and only restrict slack messages, since a question about
+        e.g. this year's policy still needs an older page."""
+        self.sources = sources or set()
+        self.channels = channels or set()
+        self.after = after
+        self.before = before
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.sources or self.channels or self.after or self.before)
+
+    @classmethod
+    def from_query(cls, query: str, now: datetime | None = None) -> 'QueryFilter':
+        """the filter a user asked for in their question: #channel mentions, 'in slack' or 'in notion', and
+        periods like 'today', 'yesterday', 'this week' or 'last 3 months' (the last 3 * 30 days)."""
+        now = now or datetime.utcnow()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        text = query.casefold()
+
+        sources = {SOURCES[source] for source in SOURCE_PATTERN.findall(text)}
+        channels = set(CHANNEL_PATTERN.findall(text))
+
+        after, before = None, None
+        if match := PERIOD_PATTERN.search(text):
+            after = now - timedelta(days=int(match.group(1) or 1) * UNITS[match.group(2)])
+        elif match := CALENDAR_PATTERN.search(text):
+            after = {
+                'yesterday': today - timedelta(days=1),
+                'today': today,
+                'this week': today - timedelta(days=today.weekday()),
+                'this month': today.replace(day=1),
+                'this year': today.replace(month=1, day=1),
+            }[match.group(1)]
+            before = today if match.group(1) == 'yesterday' else None
+
+        return cls(sources=sources, channels=channels, after=after, before=before)
+
+
+class MetadataIndex:
+    def __init__(self, docs: Sequence['Doc']):
+        """columns with the source, slack channel and last edit time of every doc, so queries
+        can be restricted to matching rows with boolean masks before their similarities are computed.
+        row i belongs to docs[i]."""
+        self.source_codes: dict[str, int] = dict()
+        self.channel_codes: dict[str, int] = dict()  # channel names and ids -> code
+
+        n = len(docs)
+        self.sources = np.empty(n, dtype=np.int8)
+        self.channels = np.full(n, -1, dtype=np.int32)
+        self.last_edited = np.empty(n, dtype=np.float64)  # for slack, the time of the latest reply
+
+        for i, doc in enumerate(docs):
+            self.sources[i] = self.source_codes.setdefault(type(doc).__name__, len(self.source_codes))
+            self.last_edited[i] = to_timestamp(doc.last_edited)
+
+            if channel_id := getattr(doc, 'channel_id', None):
+                code = self.channel_codes.setdefault(channel_id.casefold(), len(self.channel_codes))
+                if match := HEADER_CHANNEL_PATTERN.match(doc.header):
+                    self.channel_codes.setdefault(match.group(1).casefold(), code)
+                self.channels[i] = code
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    def mask(self, query_filter: QueryFilter) -> np.ndarray:
+        """which rows match the filter. sources and channels that no doc has are ignored. periods only apply to slack."""
+        mask = np.ones(len(self), dtype=bool)
+
+        sources = [self.source_codes[source] for source in query_filter.sources if source in self.source_codes]
+        if sources:
+            mask &= np.isin(self.sources, sources)
+
+        channels = [self.channel_codes[channel.casefold()] for channel in query_filter.channels
+                    if channel.casefold() in self.channel_codes]
+        if channels:
+            mask &= np.isin(self.channels, channels)
+
+        is_slack = self.sources == self.source_codes.get(SOURCES['slack'], -1)
+        if query_filter.after:
+            mask &= ~is_slack | (self.last_edited >= to_timestamp(query_filter.after))
+        if query_filter.before:
+            mask &= ~is_slack | (self.last_edited < to_timestamp(query_filter.before))
+
+        return mask
+
+    def recency(self, now: datetime, half_life_days: float) -> np.ndarray:
+        """1 for docs edited now, halving every half_life_days."""
+        age_days = np.maximum(0, to_timestamp(now) - self.last_edited) / (24 * 60 * 60)
+        return np.exp2(-age_days / half_life_days)
@@ -0,0 +1,39 @@
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from src.config import Config
+
+
+class VectorIndex(ABC):
+    def __init__(self, config: 'Config'):
+        """finds the rows of the embeddings matrix that are most similar to a query vector."""
+        self.config = config
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+
+    @abstractmethod
+    def build(self, matrix: np.ndarray, hashes: list[str]):
+        """index the rows of an L2-normalized embeddings matrix. hashes[i] is the hash of the doc in row i."""
+
+    @abstractmethod
+    def search(
+            self, query_vector: np.ndarray, k: int, mask: np.ndarray | None = None, bias: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """return the rows of (at most) the k most similar docs and their similarities, most similar first.
+        only rows where mask is True are searched. bias[i] is added to the similarity of row i."""
+
+    def save(self):
+        """persist the index next to the embeddings. indexes that are cheap to build don't need this."""
+
+    @staticmethod
+    def top_k(similarities: np.ndarray, k: int) -> np.ndarray:
+        """positions of the k highest similarities, highest first. only the top k are sorted."""
+        if k <= 0:
+            return np.empty(0, dtype=int)
+        if k < len(similarities):
+            top = np.argpartition(similarities, -k)[-k:]
+        else:
+            top = np.arange(len(similarities))
+        return top[np.argsort(similarities[top])[::-1]]
@@ -0,0 +1,51 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LRUCache:
+    def __init__(self, max_size: int):
+        """thread-safe dict that drops the least recently used entries when it holds more than max_size."""
+        self.max_size = max_size
+        self.data: OrderedDict[Hashable, Any] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self.lock:
+            return key in self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            if key not in self.data:
+                return default
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def set(self, key: Hashable, value: Any):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def add_if_missing(self, key: Hashable, value: Any = True) -> bool:
+        """set key if it isn't in the cache yet. returns whether it was added."""
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                return False
+            self.data[key] = value
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+            return True
+
+    def keys(self) -> list[Hashable]:
+        with self.lock:
+            return list(self.data)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            return self.data.pop(key, default)
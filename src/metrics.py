@@ -0,0 +1,98 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger('metrics')
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+class Metrics:
+    def __init__(self):
+        """in-process registry of latency histograms and counters, rendered in the prometheus text format."""
+        self.lock = threading.Lock()
+        # (name, labels) -> [count per bucket, sum, count]
+        self.histograms: dict[tuple[str, tuple], list] = dict()
+        # (name, labels) -> value
+        self.counters: dict[tuple[str, tuple], float] = defaultdict(float)
+
+    @contextmanager
+    def span(self, stage: str, **fields):
+        """time a stage, log it and add it to the stage_duration_seconds histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe('stage_duration_seconds', seconds, stage=stage)
+            logger.info(json.dumps({'event': 'span', 'stage': stage, 'seconds': round(seconds, 6), **fields}))
+
+    def timed(self, stage: str):
+        """decorator version of span."""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def log(self, event: str, **fields):
+        """log a structured event."""
+        logger.info(json.dumps({'event': event, **fields}))
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+            histogram = self.histograms[key]
+            bucket = bisect_left(BUCKETS, value)
+            if bucket < len(BUCKETS):
+                histogram[0][bucket] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def increment(self, name: str, value: float = 1, **labels):
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def render(self) -> str:
+        """all metrics in the prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f'# TYPE {name} histogram')
+                for (histogram_name, labels), (buckets, total, count) in sorted(self.histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    cumulative = 0
+                    for upper_bound, bucket_count in zip(BUCKETS, buckets):
+                        cumulative += bucket_count
+                        lines.append(f'{name}_bucket{format_labels(labels, le=upper_bound)} {cumulative}')
+                    lines.append(f'{name}_bucket{format_labels(labels, le="+Inf")} {count}')
+                    lines.append(f'{name}_sum{format_labels(labels)} {total}')
+                    lines.append(f'{name}_count{format_labels(labels)} {count}')
+
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f'# TYPE {name} counter')
+                for (counter_name, labels), value in sorted(self.counters.items()):
+                    if counter_name == name:
+                        lines.append(f'{name}{format_labels(labels)} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels: tuple, **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+
+metrics = Metrics()  # shared by the whole app
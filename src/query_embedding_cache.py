@@ -0,0 +1,59 @@
+import hashlib
+import threading
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from src.embedding_store import EmbeddingStore
+from src.lru import LRUCache
+from src.metrics import metrics
+
+if TYPE_CHECKING:
+    from src.config import Config
+
+
+class QueryEmbeddingCache:
+    def __init__(self, config: 'Config'):
+        """embeddings of recent queries, keyed by the embeddings model and the query without differences in case
+        and whitespace. the query_embedding_cache_size most recently used embeddings are kept in memory.
+        if file_query_embeddings is set, embeddings are also stored on disk, so they survive restarts."""
+        self.model = config.model_embeddings
+        self.max_size = config.query_embedding_cache_size
+        self.memory = LRUCache(max_size=self.max_size)
+        self.store = EmbeddingStore(config.file_query_embeddings) if config.file_query_embeddings else None
+        self.lock = threading.Lock()  # the store isn't thread-safe
+
+    def key(self, query: str) -> str:
+        return hashlib.md5(f'{self.model}\n{" ".join(query.casefold().split())}'.encode()).hexdigest()
+
+    def get(self, query: str) -> np.ndarray | None:
+        key = self.key(query)
+        vector = self.memory.get(key)
+        if vector is None and self.store is not None:
+            with self.lock:
+                vector = self.store.get(key)
+            if vector is not None:
+                vector = np.array(vector)
+                self.memory.set(key, vector)
+
+        metrics.increment('query_embedding_cache_total', result='miss' if vector is None else 'hit')
+        return vector
+
+    def add(self, query: str, vector: np.ndarray):
+        key = self.key(query)
+        self.memory.set(key, vector)
+        if self.store is None:
+            return
+
+        with self.lock:
+            self.store.add(key, vector)
+
+    def checkpoint(self):
+        """write buffered embeddings to disk. called by the refresh job, so the file is never rewritten while a
+        user waits for an answer."""
+        if self.store is not None:
+            with self.lock:
+                self.store.checkpoint()
+                # drop embeddings from disk once most of them were evicted from memory
+                if len(self.store) > 2 * self.max_size:
+                    self.store.compact(keep=set(self.memory.keys()))
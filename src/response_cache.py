@@ -0,0 +1,59 @@
+import hashlib
+import json
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from src.lru import LRUCache
+from src.metrics import metrics
+
+if TYPE_CHECKING:
+    from src.config import Config
+    from src.docs import Doc
+
+
+class ResponseCache:
+    def __init__(self, config: 'Config', max_per_docs: int = 8):
+        """responses to earlier prompts. a response is reused for a prompt whose embedding is at least
+        response_cache_similarity similar to the earlier prompt, for which the same docs were selected and which
+        follows the same conversation history, so follow-up questions are never answered with the response to
+        another conversation. docs are identified by their hash, so responses based on docs that changed are
+        never reused.
+
+        the cache holds the responses for response_cache_size sets of docs, at most max_per_docs per set,
+        and drops the least recently used sets first."""
+        self.ttl_seconds = config.response_cache_ttl_minutes * 60
+        self.similarity = config.response_cache_similarity
+        self.max_per_docs = max_per_docs
+        # (doc hashes, history digest) -> [(query vector, response, time it was cached)]
+        self.entries = LRUCache(max_size=config.response_cache_size)
+
+    @staticmethod
+    def key(docs: list['Doc'], history: list[dict[str, str]]) -> tuple[frozenset[str], str]:
+        """history is the conversation before the prompt."""
+        history_digest = hashlib.md5(json.dumps(history).encode()).hexdigest()
+        return frozenset(doc.hash for doc in docs), history_digest
+
+    def get(self, query_vector: np.ndarray, docs: list['Doc'], history: list[dict[str, str]]) -> str | None:
+        now = time.monotonic()
+        for vector, response, cached_at in self.entries.get(self.key(docs, history), ()):
+            if now - cached_at <= self.ttl_seconds and float(vector @ query_vector) >= self.similarity:
+                metrics.increment('response_cache_total', result='hit')
+                return response
+
+        metrics.increment('response_cache_total', result='miss')
+        return None
+
+    def add(self, query_vector: np.ndarray, docs: list['Doc'], history: list[dict[str, str]], response: str):
+        key, now = self.key(docs, history), time.monotonic()
+        entries = [entry for entry in self.entries.get(key, ()) if now - entry[2] <= self.ttl_seconds]
+        entries = entries[-(self.max_per_docs - 1):] if self.max_per_docs > 1 else []
+        self.entries.set(key, entries + [(query_vector, response, now)])
+
+    def invalidate(self, doc_hashes: set[str]):
+        """drop the responses that are based on docs that no longer exist."""
+        for key in self.entries.keys():
+            if not key[0] <= doc_hashes:
+                self.entries.pop(key)
+                metrics.increment('response_cache_total', result='invalidated')
@@ -4,6 +4,7 @@ from typing import TYPE_CHECKING
 from notion_client import Client
 
 from src.docs import NotionPage
+from src.ratelimiter import TokenBucket
 from src.retrievers.type import Retriever
 
 if TYPE_CHECKING:
@@ -14,11 +15,13 @@ class NotionRetriever(Retriever):
 
     def __init__(self, config: 'Config'):
         self.client = Client(auth=config.NOTION_API_KEY)
+        self.limiter = TokenBucket(rate=config.notion_requests_per_second)  # shared by all requests to notion
         super().__init__(
             cache_file=config.file_notion,
             config=config,
             doc_type=NotionPage,
-            scraping_kwargs={'client': self.client}
+            scraping_kwargs={'client': self.client, 'limiter': self.limiter},
+            scraping_workers=config.notion_scraping_workers,
         )
 
     def _fetch_docs(self):
@@ -28,7 +31,9 @@ class NotionRetriever(Retriever):
         results = []
 
         while has_more:
-            response = self.client.search(query='', page_size=100, start_cursor=start_cursor)
+            response = NotionPage.request(
+                self.limiter, self.client.search, query='', page_size=100, start_cursor=start_cursor
+            )
 
             start_cursor = response['next_cursor']
             has_more = response['has_more']
@@ -27,17 +27,29 @@ class SlackRetriever(Retriever):
         return self.client.auth_test()['url']
 
     def _fetch_docs(self):
-        channels = self.client.conversations_list()["channels"]
+        """fetch the messages in every channel. after the first run, only messages that are newer than the
+        previous run (minus slack_thread_lookback_days, to pick up new replies in recent threads) are fetched."""
+        channels = list(self.paginate(self.client.conversations_list, 'channels'))
 
         for channel in channels:
             if not channel['is_member']:
                 self.client.conversations_join(channel=channel['id'])
 
+        latest_timestamps: dict[str, str] = self.state.setdefault('latest_timestamps', dict())
+        lookback_seconds = self.config.slack_thread_lookback_days * 24 * 60 * 60
+
         for channel in channels:
             channel_id = channel['id']
             channel_name = channel['name']
-            messages = self.client.conversations_history(channel=channel_id)['messages']
 
+            oldest = None
+            if channel_id in latest_timestamps:
+                oldest = str(float(latest_timestamps[channel_id]) - lookback_seconds)
+
+            # the newest message comes first, so the channel is only marked as fetched up to it once all pages
+            # are fetched. otherwise, an interrupted fetch would skip the older messages on the next run.
+            latest_timestamp = latest_timestamps.get(channel_id)
+            messages = self.paginate(self.client.conversations_history, 'messages', channel=channel_id, oldest=oldest)
             for message in messages:
                 timestamp = float(message['ts'])
                 legible_timestamp = datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
@@ -47,9 +59,26 @@ class SlackRetriever(Retriever):
                 if 'latest_reply' in message:
                     last_edited = datetime.utcfromtimestamp(float(message['latest_reply']))
 
+                if float(message['ts']) > float(latest_timestamp or 0):
+                    latest_timestamp = message['ts']
+
                 yield SlackConvo(
                     header=f'Slack message in #{channel_name} from {message["user"]} at {legible_timestamp}',
                     last_edited=last_edited,
                     url=f'{self.workspace_url}archives/{channel_id}/p{microsecond_timestamp}',
                     body=message['text']
                 )
+
+            if latest_timestamp is not None:
+                latest_timestamps[channel_id] = latest_timestamp
+
+    @staticmethod
+    def paginate(method, key: str, **kwargs):
+        """yield the items of all pages of a paginated slack api method."""
+        cursor = None
+        while True:
+            response = method(cursor=cursor, limit=200, **kwargs)
+            yield from response[key]
+            cursor = response.get('response_metadata', {}).get('next_cursor')
+            if not cursor:
+                return
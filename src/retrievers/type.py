@@ -1,10 +1,13 @@
+import hashlib
 import json
-import os
+import time
 from abc import ABC, abstractmethod
-from typing import Generator, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Generator, Iterable, TYPE_CHECKING
 
 from tqdm import tqdm
 
+from src.doc_store import DocStore
 from src.docs.type import Doc
 
 if TYPE_CHECKING:
@@ -18,13 +21,19 @@ class Retriever(ABC):
             config: 'Config',
             doc_type: type(Doc),
             scraping_kwargs: dict = None,
+            scraping_workers: int = 1,
     ):
         self.cache_file = cache_file
+        self.doc_store = DocStore(cache_file)
         self.config = config
         self.doc_type = doc_type
         self.scraping_kwargs = scraping_kwargs if scraping_kwargs else dict()
+        self.scraping_workers = scraping_workers
 
         self.docs: dict[str, doc_type] = dict()
+        self.state: dict = dict()  # retriever specific data that is cached with the docs, e.g. sync cursors
+        self.dirty_urls: set[str] = set()  # docs that changed since they were last saved
+        self.last_checkpoint = time.monotonic()
         try:
             self.load_from_cache()
         except FileNotFoundError as e:
@@ -36,43 +45,99 @@ class Retriever(ABC):
         """fetch all docs that exist for this data source (without scraping)"""
 
     def scrape_docs(self):
-        for doc in self._fetch_docs():
-            self.add_doc(doc)
-        self.cache_data()
+        """fetch and scrape new and changed docs. changed docs are saved in checkpoints, so an interrupted scrape
+        resumes with the docs that weren't saved yet."""
+        try:
+            for doc in self._fetch_docs():
+                saved = self.docs[doc.url].save_to_dict() if doc.url in self.docs else None
+                if self.add_doc(doc).save_to_dict() != saved:
+                    self.mark_dirty(doc)
+                    self.checkpoint()
+
+            unscraped_docs = [doc for doc in self.docs.values() if not doc.is_scraped]
+            with ThreadPoolExecutor(max_workers=self.scraping_workers) as executor:
+                futures = {executor.submit(doc.scrape, **self.scraping_kwargs): doc for doc in unscraped_docs}
+                progress = tqdm(
+                    as_completed(futures), total=len(futures), desc=type(self).__name__, disable=not futures
+                )
+                for future in progress:
+                    future.result()
+                    self.mark_dirty(futures[future])
+                    self.checkpoint()
+        finally:
+            self.checkpoint(force=True)
+
+    def mark_dirty(self, doc: Doc):
+        self.dirty_urls.add(doc.url)
 
-        unscraped_docs = [doc for doc in self.docs.values() if not doc.is_scraped]
-        for doc in tqdm(unscraped_docs, desc=type(self).__name__, disable=not unscraped_docs):
-            doc.scrape(**self.scraping_kwargs)
-            self.cache_data()
+    def checkpoint(self, force: bool = False):
+        """save the changed docs once there are docs_checkpoint_size of them or every docs_checkpoint_seconds."""
+        checkpoint_due = time.monotonic() - self.last_checkpoint >= self.config.docs_checkpoint_seconds
+        if not force and len(self.dirty_urls) < self.config.docs_checkpoint_size and not checkpoint_due:
+            return
 
-    def add_doc(self, doc: Doc):
+        self.cache_data([self.docs[url] for url in self.dirty_urls])
+        self.dirty_urls = set()
+        self.last_checkpoint = time.monotonic()
+
+    def add_doc(self, doc: Doc) -> Doc:
+        """add a doc, or update the doc with the same url. returns the doc that is stored."""
         if doc.url in self.docs:
             self.docs[doc.url].update_from_doc(doc)
         else:
             self.docs[doc.url] = doc
+        return self.docs[doc.url]
 
-    def cache_data(self):
-        directory = os.path.dirname(self.cache_file)
-        if directory:
-            os.makedirs(directory, exist_ok=True)
-
-        data = [p.save_to_dict() for p in self.docs.values()]
-
-        with open(self.cache_file, 'w') as f:
-            json.dump(data, f)
+    def cache_data(self, docs: Iterable[Doc] | None = None):
+        """save the docs (all docs by default) and the state."""
+        docs = self.docs.values() if docs is None else docs
+        self.doc_store.upsert((doc.save_to_dict() for doc in docs), state=self.state)
 
     def load_from_cache(self):
-        if not os.path.exists(self.cache_file):
+        if not self.doc_store.exists:
             raise FileNotFoundError('Cache file not found.')
-        with open(self.cache_file) as json_file:
-            data: list[dict[str, str]] = json.load(json_file)
-        for doc_data in data:
-            doc = self.doc_type(**doc_data)
-            self.add_doc(doc)
+        for doc_data in self.doc_store.iter_docs():
+            self.add_doc(self.doc_type(**doc_data))
+        self.state = self.doc_store.load_state()
 
     @property
     def segments(self) -> list[Doc]:
-        return [
-            seg for doc in self.docs.values()
-            for seg in doc.split_into_segments(config=self.config)
-        ]
+        """split the docs into segments. segments are saved per doc in the doc store and only recomputed when the doc
+        (or the settings they depend on) changed, so only the segments of changed docs are written."""
+        model = self.config.model_chat
+        settings = json.dumps(self.segments_settings, sort_keys=True)
+        keys = {url: hashlib.md5((settings + doc.hash).encode()).hexdigest() for url, doc in self.docs.items()}
+
+        saved_segments: dict[str, list[Doc]] = dict()
+        for url, key, segments_data in self.doc_store.iter_segments():
+            if keys.get(url) != key:
+                continue
+            doc_segments = []
+            for segment_data in segments_data:
+                segment = self.docs[url].segment(segment_data['body'])
+                segment.set_token_count(model, segment_data['token_count'])
+                doc_segments.append(segment)
+            saved_segments[url] = doc_segments
+
+        segments, changed = [], []
+        for url, doc in self.docs.items():
+            doc_segments = saved_segments.get(url)
+            if doc_segments is None:
+                doc_segments = doc.split_into_segments(config=self.config)
+                segments_data = [{'body': seg.body, 'token_count': seg.token_count(model)} for seg in doc_segments]
+                changed.append((url, keys[url], segments_data))
+            segments += doc_segments
+
+        if changed:
+            self.doc_store.upsert_segments(changed)
+
+        return segments
+
+    @property
+    def segments_settings(self) -> dict:
+        """segments have to be recomputed when any of these settings change."""
+        return {
+            'doc_token_limit': self.config.doc_token_limit,
+            'doc_token_overlap': self.config.doc_token_overlap,
+            'model_chat': self.config.model_chat,
+        }
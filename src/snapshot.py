@@ -0,0 +1,126 @@
+import glob
+import json
+import os
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+import src.docs
+from src.docs.type import Doc
+from src.indexes.bm25 import BM25Index
+from src.indexes.metadata import MetadataIndex
+
+if TYPE_CHECKING:
+    from src.config import Config
+    from src.indexes import TermCache, VectorIndex
+
+
+class IndexSnapshot:
+    def __init__(
+            self,
+            docs: list[Doc],
+            embedded_docs: list[Doc],
+            embeddings_matrix: np.ndarray,
+            token_counts: np.ndarray,
+            vector_index: 'VectorIndex',
+            lexical_index: BM25Index | None = None,
+            metadata_index: MetadataIndex | None = None,
+            created_at: float | None = None,
+    ):
+        """everything queries are answered from. a snapshot is never changed after it is built: refreshes build a
+        new snapshot and swap it in, so queries never see a half-built corpus.
+        row i of the embeddings matrix and token counts belong to embedded_docs[i]."""
+        embeddings_matrix.setflags(write=False)
+        token_counts.setflags(write=False)
+
+        self.docs = tuple(docs)
+        self.embedded_docs = tuple(embedded_docs)
+        self.embeddings_matrix = embeddings_matrix
+        self.token_counts = token_counts
+        self.vector_index = vector_index
+        self.lexical_index = lexical_index  # only used for hybrid retrieval
+        self.metadata_index = metadata_index or MetadataIndex(self.embedded_docs)
+        self.created_at = time.time() if created_at is None else created_at
+
+    @property
+    def hashes(self) -> list[str]:
+        return [doc.hash for doc in self.embedded_docs]
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.created_at
+
+    def save(self, file: str):
+        """write the embedded docs and their embeddings to disk, so the app can answer queries right after a restart.
+        every snapshot writes its embeddings (and lexical index) to new files, which the docs file refers to. the docs
+        file is replaced atomically once they are complete, so it never refers to files of another snapshot."""
+        directory = os.path.dirname(file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        base = os.path.splitext(file)[0]
+        matrix_file = f'{base}_embeddings_{int(self.created_at * 1000)}.npy'
+        with open(matrix_file + '.tmp', 'wb') as f:
+            np.save(f, self.embeddings_matrix)
+        os.replace(matrix_file + '.tmp', matrix_file)
+        new_files = [matrix_file]
+
+        data = {
+            'created_at': self.created_at,
+            'embeddings_file': os.path.basename(matrix_file),
+            'docs': [{'type': type(doc).__name__, **doc.save_to_dict()} for doc in self.embedded_docs],
+            'token_counts': self.token_counts.tolist(),
+        }
+        if self.lexical_index is not None:
+            lexical_file = f'{base}_lexical_{int(self.created_at * 1000)}.npz'
+            with open(lexical_file + '.tmp', 'wb') as f:
+                self.lexical_index.save(f)
+            os.replace(lexical_file + '.tmp', lexical_file)
+            new_files.append(lexical_file)
+            data['lexical_file'] = os.path.basename(lexical_file)
+
+        with open(file + '.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(file + '.tmp', file)
+
+        for old_file in glob.glob(glob.escape(base) + '_embeddings_*') + glob.glob(glob.escape(base) + '_lexical_*'):
+            if old_file not in new_files:
+                os.remove(old_file)
+
+    @classmethod
+    def load(cls, file: str, config: 'Config', term_cache: 'TermCache | None' = None) -> 'IndexSnapshot | None':
+        """the snapshot that was saved last, or None if there is none. the embeddings are memory mapped.
+        the lexical index is loaded (or built, if the snapshot has none) if a term cache is given."""
+        if not os.path.exists(file):
+            return None
+
+        with open(file) as f:
+            data = json.load(f)
+        matrix = np.load(os.path.join(os.path.dirname(file), data['embeddings_file']), mmap_mode='r')
+
+        # src.docs only imports the doc types the snapshot contains, e.g. not notion_client for slack messages
+        docs = [getattr(src.docs, doc_data.pop('type'))(**doc_data) for doc_data in data['docs']]
+        hashes = [doc.hash for doc in docs]
+        # restore the memoized token counts, so prompts are built without tokenizing the docs again
+        for doc, token_count in zip(docs, data['token_counts']):
+            doc.set_token_count(config.model_chat, token_count)
+        vector_index = config.get_vector_index()
+        vector_index.build(matrix, hashes)
+        lexical_index = None
+        if term_cache is not None:
+            lexical_index = BM25Index(term_cache)
+            if 'lexical_file' in data:
+                lexical_index.load(os.path.join(os.path.dirname(file), data['lexical_file']))
+            else:
+                lexical_index.build([str(doc) for doc in docs], hashes)
+
+        return cls(
+            docs=docs,
+            embedded_docs=docs,
+            embeddings_matrix=matrix,
+            token_counts=np.asarray(data['token_counts'], dtype=np.int64),
+            vector_index=vector_index,
+            lexical_index=lexical_index,
+            created_at=data['created_at'],
+        )
@@ -0,0 +1,110 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable
+
+import numpy as np
+import pytest
+
+import src.docs.type
+from benchmarks.synthetic import WordEncoding, tiktoken_available
+from src.config import Config
+from src.docs import Doc, NotionPage, SlackConvo
+from src.snapshot import IndexSnapshot
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch) -> Config:
+    """a config that keeps all data in a temporary directory.
+    tokens are counted with a stand-in for the duration of the test if tiktoken can't download its encodings."""
+    config = Config(args=[
+        '--NOTION_API_KEY', 'test',
+        '--OPENAI_ORG', 'test',
+        '--OPENAI_API_KEY', 'test',
+        '--SLACK_TOKEN', 'test',
+        '--SLACK_SIGNING_SECRET', 'test',
+        '--interface', 'cli',
+        '--file_embeddings', str(tmp_path / 'embeddings.bin'),
+        '--file_history', str(tmp_path / 'history.db'),
+        '--file_notion', str(tmp_path / 'notion.db'),
+        '--file_query_embeddings', str(tmp_path / 'query_embeddings.bin'),
+        '--file_slack', str(tmp_path / 'slack.db'),
+        '--file_snapshot', str(tmp_path / 'snapshot.json'),
+        '--file_vector_index', str(tmp_path / 'vector_index.npz'),
+    ])
+    if not cached_tiktoken_available(config.model_chat):
+        encoding = WordEncoding()
+        monkeypatch.setattr(src.docs.type, 'get_encoding', lambda _model: encoding)
+    return config
+
+
+@lru_cache(maxsize=None)
+def cached_tiktoken_available(model: str) -> bool:
+    return tiktoken_available(model)
+
+
+@pytest.fixture
+def slack_message() -> Callable[[int, str], SlackConvo]:
+    """makes the i-th message in #general, sent i minutes after 2023-01-01."""
+    def make(i: int, body: str) -> SlackConvo:
+        timestamp = datetime(2023, 1, 1, 0, i)
+        return SlackConvo(
+            body=body,
+            header=f'Slack message in #general from U{i:08d} at {timestamp}',
+            url=f'https://test.slack.com/archives/C00000001/p{int(timestamp.timestamp() * 10e6)}',
+            last_edited=timestamp,
+            last_scraped=timestamp,
+        )
+    return make
+
+
+@pytest.fixture
+def notion_page() -> Callable[[int, str, datetime], NotionPage]:
+    """makes the i-th page below the HR page."""
+    def make(i: int, body: str, last_edited: datetime) -> NotionPage:
+        return NotionPage(
+            body=body,
+            header=f'Notion Page: HR/Page {i}\nLast Edited: {last_edited}',
+            url=f'https://www.notion.so/Page-{i:032x}',
+            last_edited=last_edited,
+            last_scraped=last_edited,
+        )
+    return make
+
+
+@pytest.fixture
+def save_snapshot(config) -> Callable[[list[Doc]], np.ndarray]:
+    """saves a snapshot of docs to config.file_snapshot and returns their token counts."""
+    def save(docs: list[Doc]) -> np.ndarray:
+        token_counts = np.array([doc.token_count(config.model_chat) for doc in docs], dtype=np.int64)
+        IndexSnapshot(
+            docs=docs,
+            embedded_docs=docs,
+            embeddings_matrix=np.eye(len(docs), dtype=np.float32),
+            token_counts=token_counts,
+            vector_index=config.get_vector_index(),
+        ).save(config.file_snapshot)
+        return token_counts
+    return save
+
+
+class FakeClock:
+    def __init__(self):
+        """time that only passes when something sleeps."""
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        """like time.sleep, sleeps at least a microsecond, so waits that are rounded down to nothing still pass."""
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 1e-6)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    """a fake clock for the rate limiter."""
+    clock = FakeClock()
+    monkeypatch.setattr('src.ratelimiter.time', clock)
+    return clock
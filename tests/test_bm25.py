@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from src.indexes.bm25 import BM25Index, TermCache, tokenize
+
+TEXTS = [
+    'the deploy failed with INC-1234',
+    'deploy the service on monday',
+    'the on-call rotation changes on monday',
+    'lunch is at noon',
+]
+
+
+def build(texts: list[str], term_cache: TermCache | None = None) -> BM25Index:
+    index = BM25Index(term_cache)
+    index.build(texts, [f'{i:032x}' for i in range(len(texts))])
+    return index
+
+
+def bm25(query: list[str], texts: list[str], row: int, k1: float = 1.2, b: float = 0.75) -> float:
+    """the score of one doc, computed term by term."""
+    docs = [tokenize(text) for text in texts]
+    average_length = sum(len(doc) for doc in docs) / len(docs)
+    score = 0
+    for term in set(query):
+        n = sum(term in doc for doc in docs)
+        count = docs[row].count(term)
+        idf = np.log(1 + (len(docs) - n + 0.5) / (n + 0.5))
+        score += idf * count * (k1 + 1) / (count + k1 * (1 - b + b * len(docs[row]) / average_length))
+    return score
+
+
+def test_identifiers_are_kept_whole_and_split():
+    assert tokenize('See INC-1234 in #eng-oncall.') == ['see', 'inc-1234', 'inc', '1234', 'in', 'eng-oncall', 'eng',
+                                                        'oncall']
+
+
+def test_docs_are_scored_with_bm25():
+    index = build(TEXTS)
+
+    rows, scores = index.search('deploy on monday', k=10)
+    assert rows.tolist() == [1, 2, 0]  # the doc about lunch has none of the words
+    assert scores == pytest.approx([bm25(['deploy', 'on', 'monday'], TEXTS, row) for row in rows], rel=1e-5)
+    assert np.all(np.diff(scores) <= 0)
+
+    assert index.search('inc-1234', k=10)[0].tolist() == [0]
+    assert index.search('deploy on monday', k=1)[0].tolist() == [1]
+    assert index.search('unknown words', k=10)[0].tolist() == []
+
+
+def test_masked_rows_are_not_searched_but_count_for_idf():
+    index = build(TEXTS)
+    rows, scores = index.search('deploy on monday', k=10)
+
+    masked_rows, masked_scores = index.search('deploy on monday', k=10, mask=np.array([True, False, True, True]))
+    assert masked_rows.tolist() == [2, 0]
+    assert masked_scores == pytest.approx(scores[1:])
+
+
+def test_a_saved_index_finds_the_same_docs(tmp_path):
+    index = build(TEXTS)
+    index.save(str(tmp_path / 'lexical.npz'))
+
+    loaded = BM25Index(TermCache())
+    loaded.load(str(tmp_path / 'lexical.npz'))
+    for query in ('deploy on monday', 'INC-1234 failed', 'lunch'):
+        rows, scores = index.search(query, k=10)
+        loaded_rows, loaded_scores = loaded.search(query, k=10)
+        assert loaded_rows.tolist() == rows.tolist()
+        assert loaded_scores == pytest.approx(scores)
+
+
+def test_docs_are_tokenized_once_per_term_cache(monkeypatch):
+    term_cache = TermCache()
+    build(TEXTS, term_cache)
+    monkeypatch.setattr('src.indexes.bm25.tokenize', lambda text: 1 / 0)
+
+    index = build(TEXTS[:2], term_cache)  # e.g. the next refresh, after two docs were deleted
+    assert index.n_docs == 2
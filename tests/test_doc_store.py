@@ -0,0 +1,68 @@
+import json
+
+from src.doc_store import DocStore
+from src.docs import SlackConvo
+from src.retrievers.slack import SlackRetriever
+
+
+def test_the_json_cache_of_a_retriever_is_migrated(config, slack_message, monkeypatch):
+    docs = [slack_message(i, f'message {i}') for i in range(3)]
+    with open(config.file_slack.removesuffix('.db') + '.json', 'w') as f:
+        json.dump([doc.save_to_dict() for doc in docs], f)
+    monkeypatch.setattr('src.retrievers.slack.WebClient', lambda token: None)
+
+    retriever = SlackRetriever(config)  # loads the migrated docs instead of scraping
+    assert [doc.save_to_dict() for doc in retriever.docs.values()] == [doc.save_to_dict() for doc in docs]
+    assert retriever.state == {}
+    assert len(DocStore(config.file_slack)) == 3
+
+
+def test_a_configured_json_cache_is_migrated_next_to_it(config, slack_message):
+    file_json = config.file_slack.removesuffix('.db') + '.json'
+    with open(file_json, 'w') as f:
+        json.dump([slack_message(0, 'message 0').save_to_dict()], f)
+
+    store = DocStore(file_json)
+    assert store.file == config.file_slack
+    assert [doc['body'] for doc in store.iter_docs()] == ['message 0']
+    assert [doc['body'] for doc in DocStore(file_json).iter_docs()] == ['message 0']
+
+
+def test_docs_are_read_in_batches(config, slack_message):
+    store = DocStore(config.file_slack)
+    store.upsert(slack_message(i, f'message {i}').save_to_dict() for i in range(5))
+
+    queries = []
+    connection = store.connection
+    store.connection = type('CountingConnection', (), {
+        'execute': lambda _, sql, *args: queries.append(sql) or connection.execute(sql, *args),
+    })()
+
+    docs = store.iter_docs(batch_size=2)
+    assert SlackConvo(**next(docs)).body == 'message 0'
+    assert len(queries) == 1
+    assert [doc['body'] for doc in docs] == [f'message {i}' for i in range(1, 5)]
+    assert len(queries) == 4  # three batches and one that is empty
+
+
+def test_retrievers_load_docs_while_they_are_read(config, slack_message, monkeypatch):
+    DocStore(config.file_slack).upsert(slack_message(i, f'message {i}').save_to_dict() for i in range(3))
+    events = []
+    iter_docs, add_doc = DocStore.iter_docs, SlackRetriever.add_doc
+
+    def recording_iter_docs(self, batch_size: int = 1000):
+        for doc_data in iter_docs(self, batch_size):
+            events.append('read')
+            yield doc_data
+
+    def recording_add_doc(self, doc):
+        events.append('add')
+        return add_doc(self, doc)
+
+    monkeypatch.setattr(DocStore, 'iter_docs', recording_iter_docs)
+    monkeypatch.setattr(SlackRetriever, 'add_doc', recording_add_doc)
+    monkeypatch.setattr('src.retrievers.slack.WebClient', lambda token: None)
+
+    retriever = SlackRetriever(config)
+    assert len(retriever.docs) == 3
+    assert events == ['read', 'add'] * 3
@@ -0,0 +1,107 @@
+import threading
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import RateLimitError
+
+from benchmarks.synthetic import StubEmbeddings
+from src.docselector import DocSelector
+
+
+class RateLimitedEmbeddings(StubEmbeddings):
+    def __init__(self, dim: int, fail_every: int, retry_after: str | None = '0'):
+        """answers every fail_every-th request with a 429 and returns the embeddings in reverse order."""
+        super().__init__(dim, latency=0)
+        self.fail_every = fail_every
+        self.retry_after = retry_after
+        self.failures = 0
+        self.successful_inputs: list[list[str]] = []
+        self.count_lock = threading.Lock()
+
+    def create(self, input: list[str], model: str):
+        with self.count_lock:
+            self.requests += 1
+            fail = self.requests % self.fail_every == 0
+            if fail:
+                self.failures += 1
+        if fail:
+            headers = {} if self.retry_after is None else {'retry-after': self.retry_after}
+            request = httpx.Request('POST', 'https://api.openai.com/v1/embeddings')
+            response = httpx.Response(429, headers=headers, request=request)
+            raise RateLimitError('rate limited', response=response, body=None)
+
+        with self.count_lock:
+            self.successful_inputs.append(list(input))
+        data = [SimpleNamespace(index=i, embedding=self.embedding(text)) for i, text in enumerate(input)]
+        return SimpleNamespace(data=data[::-1])
+
+
+def make_selector(config, embeddings: StubEmbeddings) -> DocSelector:
+    return DocSelector(config, openai_client=SimpleNamespace(embeddings=embeddings))
+
+
+def test_client_does_not_retry_on_its_own(config):
+    assert DocSelector(config).openai_client.max_retries == 0
+
+
+def test_fetch_embeddings_retries_rate_limited_batches_in_order(config, monkeypatch):
+    delays = []
+    monkeypatch.setattr('src.docselector.time.sleep', delays.append)
+    config.embeddings_batch_size = 4
+    embeddings = RateLimitedEmbeddings(dim=8, fail_every=3, retry_after='0.25')
+    selector = make_selector(config, embeddings)
+
+    texts = [f'text {i}' for i in range(10)]
+    batches = [texts[i:i + 4] for i in range(0, 10, 4)]
+    results = [selector.fetch_embeddings(batch) for batch in batches]
+
+    assert embeddings.successful_inputs == batches
+    assert embeddings.requests == len(batches) + embeddings.failures
+    assert delays == [0.25] * embeddings.failures
+    for batch, result in zip(batches, results):
+        assert result == [embeddings.embedding(text) for text in batch]
+
+
+def test_fetch_embeddings_backs_off_without_retry_after(config, monkeypatch):
+    delays = []
+    monkeypatch.setattr('src.docselector.time.sleep', delays.append)
+    config.embeddings_max_retries = 2
+    embeddings = RateLimitedEmbeddings(dim=8, fail_every=1, retry_after=None)
+    selector = make_selector(config, embeddings)
+
+    with pytest.raises(RateLimitError):
+        selector.fetch_embeddings(['text'])
+    assert embeddings.requests == 3
+    assert len(delays) == 2
+    assert 1 <= delays[0] < 2 and 2 <= delays[1] < 3
+
+
+class Segment:
+    def __init__(self, doc_hash: str, text: str):
+        """the parts of a doc that embedding needs."""
+        self.hash = doc_hash
+        self.text = text
+        self.embedding = None
+
+    def __str__(self):
+        return self.text
+
+    def set_embedding(self, embedding):
+        self.embedding = embedding
+
+
+def test_fetch_missing_embeddings_batches_requests(config, monkeypatch):
+    monkeypatch.setattr('src.docselector.time.sleep', lambda _seconds: None)
+    config.embeddings_batch_size = 5
+    config.embeddings_workers = 3
+    embeddings = RateLimitedEmbeddings(dim=8, fail_every=4)
+    selector = make_selector(config, embeddings)
+
+    segments = [Segment(f'{i:032x}', f'doc {i}') for i in range(23)]
+    selector._fetch_missing_embeddings(segments)
+
+    assert sorted(len(batch) for batch in embeddings.successful_inputs) == [3, 5, 5, 5, 5]
+    assert embeddings.requests == 5 + embeddings.failures
+    for segment in segments:
+        assert list(segment.embedding) == pytest.approx(embeddings.embedding(segment.text))
@@ -0,0 +1,41 @@
+import json
+
+import numpy as np
+
+from src.embedding_store import EmbeddingStore
+
+
+def test_empty_legacy_json_is_migrated_without_losing_later_embeddings(tmp_path):
+    with open(tmp_path / 'embeddings.json', 'w') as f:
+        json.dump({}, f)
+    file = str(tmp_path / 'embeddings.bin')
+
+    store = EmbeddingStore(file)
+    assert len(store) == 0
+    store.add('a' * 32, [1.0, 2.0, 3.0])
+    store.checkpoint()
+
+    reloaded = EmbeddingStore(file)
+    assert len(reloaded) == 1
+    np.testing.assert_array_equal(reloaded.get('a' * 32), [1.0, 2.0, 3.0])
+
+
+def test_embeddings_survive_reload(tmp_path):
+    file = str(tmp_path / 'embeddings.bin')
+    store = EmbeddingStore(file, checkpoint_size=2)
+    store.add_many([(f'{i:032x}', [float(i), 0.0]) for i in range(5)])
+    store.checkpoint()
+
+    reloaded = EmbeddingStore(file)
+    assert len(reloaded) == 5
+    np.testing.assert_array_equal(reloaded.get(f'{4:032x}'), [4.0, 0.0])
+
+
+def test_a_configured_json_file_is_migrated_next_to_it(tmp_path):
+    with open(tmp_path / 'embeddings.json', 'w') as f:
+        json.dump({'a' * 32: [1.0, 2.0, 3.0]}, f)
+
+    store = EmbeddingStore(str(tmp_path / 'embeddings.json'))
+    assert store.file == str(tmp_path / 'embeddings.bin')
+    np.testing.assert_array_equal(store.get('a' * 32), [1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(EmbeddingStore(str(tmp_path / 'embeddings.json')).get('a' * 32), [1.0, 2.0, 3.0])
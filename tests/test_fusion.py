@@ -0,0 +1,27 @@
+import numpy as np
+
+from src.indexes.fusion import reciprocal_rank_fusion
+
+
+def test_rows_that_rank_well_in_several_rankings_come_first():
+    vector_rows = np.array([3, 1, 4])
+    lexical_rows = np.array([1, 5])
+
+    assert reciprocal_rank_fusion([vector_rows, lexical_rows]).tolist() == [1, 3, 5, 4]
+
+
+def test_ties_are_broken_by_row():
+    assert reciprocal_rank_fusion([np.array([2, 1]), np.array([1, 2])]).tolist() == [1, 2]
+    assert reciprocal_rank_fusion([np.array([7]), np.array([3])]).tolist() == [3, 7]
+
+
+def test_k_weighs_lower_ranks():
+    rankings = [np.array([0, 1, 2, 3]), np.array([8, 5, 6, 3])]
+    # with a small k, the top rank of a single ranking wins, with a large k the row in both rankings wins
+    assert reciprocal_rank_fusion(rankings, k=1)[0] == 0
+    assert reciprocal_rank_fusion(rankings, k=60)[0] == 3
+
+
+def test_empty_rankings():
+    assert reciprocal_rank_fusion([np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)]).tolist() == []
+    assert reciprocal_rank_fusion([np.array([4]), np.empty(0, dtype=np.int64)]).tolist() == [4]
@@ -0,0 +1,62 @@
+import pytest
+
+from src.history.sqlite import SQLiteHistoryStore
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def history(config, request):
+    config.history = request.param
+    config.history_length = 3
+    return config.get_history_store()
+
+
+def message(i: int) -> dict[str, str]:
+    return {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f'message {i}'}
+
+
+def test_only_the_newest_messages_are_kept(history):
+    for i in range(5):
+        history.append('U1', **message(i))
+
+    assert history.get('U1') == [message(2), message(3), message(4)]
+    if isinstance(history, SQLiteHistoryStore):
+        assert history.connection.execute('SELECT COUNT(*) FROM messages').fetchone()[0] == 3
+
+
+def test_messages_are_kept_per_user_in_order(history):
+    for i in range(4):
+        history.append('U1', **message(i))
+        history.append('U2', **message(10 + i))
+
+    assert history.get('U1') == [message(1), message(2), message(3)]
+    assert history.get('U2') == [message(11), message(12), message(13)]
+    assert history.get('U3') == []
+
+
+def test_idle_users_are_forgotten(history):
+    history._append('U1', message(0), timestamp=100)
+    history._append('U1', message(1), timestamp=200)
+    history._append('U2', message(2), timestamp=150)
+
+    history.evict_idle(before=180)
+    assert history.get('U1') == [message(0), message(1)]  # active since its last message
+    assert history.get('U2') == []
+
+    history.evict_idle(before=201)
+    assert history.get('U1') == []
+
+
+def test_idle_users_are_evicted_while_messages_are_appended(history, monkeypatch):
+    history.eviction_interval = 0
+    history._append('U1', message(0), timestamp=0)
+    monkeypatch.setattr('src.history.type.time.time', lambda: history.idle_seconds + 1)
+
+    history.append('U2', **message(1))
+    assert history.get('U1') == []
+    assert history.get('U2') == [message(1)]
+
+
+def test_sqlite_history_survives_restarts(config):
+    config.history = 'sqlite'
+    config.get_history_store().append('U1', **message(0))
+    assert config.get_history_store().get('U1') == [message(0)]
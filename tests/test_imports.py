@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOAD_SNAPSHOT = '''
+import sys
+from src.config import Config
+from src.chat_interfaces import CliInterface
+from src.docselector import DocSelector
+from src.snapshot import IndexSnapshot
+
+modules = ('fastapi', 'notion_client', 'slack_sdk', 'src.indexes.ivf')
+config = Config(args={args!r})
+config.get_interface_type()
+print(sorted(module for module in modules if module in sys.modules))
+IndexSnapshot.load(config.file_snapshot, config)
+print(sorted(module for module in modules if module in sys.modules))
+'''
+
+
+def test_cli_only_imports_the_clients_of_the_docs_in_its_snapshot(config, slack_message, save_snapshot):
+    save_snapshot([slack_message(i, f'message {i}') for i in range(3)])
+
+    args = [
+        '--NOTION_API_KEY', 'test', '--OPENAI_ORG', 'test', '--OPENAI_API_KEY', 'test', '--SLACK_TOKEN', 'test',
+        '--SLACK_SIGNING_SECRET', 'test', '--interface', 'cli', '--file_snapshot', config.file_snapshot,
+    ]
+    process = subprocess.run(
+        [sys.executable, '-c', LOAD_SNAPSHOT.format(args=args)], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    assert process.stdout.splitlines()[-2:] == ['[]', "['slack_sdk']"]
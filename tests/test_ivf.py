@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_embeddings
+from src.indexes.brute_force import BruteForceIndex
+from src.indexes.ivf import IVFIndex
+
+
+@pytest.fixture
+def matrix() -> np.ndarray:
+    return synthetic_embeddings(2000, dim=32, n_topics=20)
+
+
+def hashes(n: int) -> list[str]:
+    return [f'{i:032x}' for i in range(n)]
+
+
+def count_trainings(index: IVFIndex, monkeypatch) -> list[int]:
+    sizes = []
+    train = index.train
+    monkeypatch.setattr(index, 'train', lambda matrix: sizes.append(len(matrix)) or train(matrix))
+    return sizes
+
+
+def test_new_rows_are_assigned_without_retraining(config, matrix, monkeypatch):
+    index = IVFIndex(config)
+    trainings = count_trainings(index, monkeypatch)
+    index.build(matrix[:1000], hashes(1000))
+    centroids, lists = index.centroids.copy(), dict(index.hash_to_list)
+
+    index.build(matrix[:1500], hashes(1500))
+    assert trainings == [1000]
+    np.testing.assert_array_equal(index.centroids, centroids)
+    assert all(index.hash_to_list[doc_hash] == lists[doc_hash] for doc_hash in lists)
+    new_lists = [index.hash_to_list[doc_hash] for doc_hash in hashes(1500)[1000:]]
+    assert new_lists == np.argmax(matrix[1000:1500] @ centroids.T, axis=1).tolist()
+
+
+def test_the_index_is_retrained_once_the_corpus_has_grown(config, matrix, monkeypatch):
+    index = IVFIndex(config)
+    trainings = count_trainings(index, monkeypatch)
+    index.build(matrix[:400], hashes(400))
+    index.build(matrix[:1600], hashes(1600))  # exactly retrain_factor times the training size
+    assert trainings == [400]
+
+    index.build(matrix[:1601], hashes(1601))
+    assert trainings == [400, 1601]
+    assert index.trained_size == 1601
+    assert len(index.centroids) == int(np.sqrt(1601))
+
+
+def test_a_saved_index_is_loaded_without_retraining(config, matrix, monkeypatch):
+    index = IVFIndex(config)
+    index.build(matrix, hashes(len(matrix)))
+    index.save()
+
+    loaded = IVFIndex(config)
+    trainings = count_trainings(loaded, monkeypatch)
+    np.testing.assert_array_equal(loaded.centroids, index.centroids)
+    assert loaded.trained_size == len(matrix)
+    assert loaded.hash_to_list == index.hash_to_list
+
+    loaded.build(matrix, hashes(len(matrix)))
+    assert trainings == []
+    query = matrix[7]
+    assert loaded.search(query, k=10)[0].tolist() == index.search(query, k=10)[0].tolist()
+
+
+def test_recall_against_brute_force(config, matrix):
+    index, exact = IVFIndex(config), BruteForceIndex(config)
+    index.build(matrix, hashes(len(matrix)))
+    exact.build(matrix, hashes(len(matrix)))
+    queries = synthetic_embeddings(50, dim=32, n_topics=20, seed=1)
+    mask = np.arange(len(matrix)) % 3 == 0
+
+    for search_mask in (None, mask):
+        found = 0
+        for query in queries:
+            rows, similarities = index.search(query, k=10, mask=search_mask)
+            assert np.all(np.diff(similarities) <= 0)
+            if search_mask is not None:
+                assert np.all(search_mask[rows])
+            found += len(set(rows.tolist()) & set(exact.search(query, k=10, mask=search_mask)[0].tolist()))
+        assert found / (10 * len(queries)) >= 0.9
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import numpy as np
+
+from src.indexes.metadata import MetadataIndex, QueryFilter
+
+NOW = datetime(2024, 6, 12, 15, 30)
+
+
+def test_periods_only_restrict_slack_messages(slack_message, notion_page):
+    query_filter = QueryFilter.from_query("What's the PTO policy for this year?", now=NOW)
+    assert query_filter.after == datetime(2024, 1, 1)
+    assert not query_filter.sources
+
+    old_message = slack_message(0, 'pto is 20 days')  # sent in 2023
+    new_message = slack_message(1, 'pto is 25 days')
+    new_message.last_edited = datetime(2024, 3, 1)
+    old_page = notion_page(2, 'PTO policy', datetime(2022, 5, 1))
+    index = MetadataIndex([old_message, new_message, old_page])
+
+    assert index.mask(query_filter).tolist() == [False, True, True]
+
+
+def test_topics_and_similar_words_are_not_filters(slack_message, notion_page):
+    query_filter = QueryFilter.from_query('how do I set up notifications from Slack', now=NOW)
+    assert query_filter.is_empty
+
+    query_filter = QueryFilter.from_query("what are todays meetings? what's this weekend's plan?", now=NOW)
+    assert query_filter.is_empty
+
+    index = MetadataIndex([slack_message(0, 'notifications'), notion_page(1, 'notifications', datetime(2022, 5, 1))])
+    assert np.all(index.mask(query_filter))
+
+
+def test_explicit_filters_are_parsed():
+    query_filter = QueryFilter.from_query('what did #eng-oncall say in Slack yesterday?', now=NOW)
+    assert query_filter.sources == {'SlackConvo'}
+    assert query_filter.channels == {'eng-oncall'}
+    assert (query_filter.after, query_filter.before) == (datetime(2024, 6, 11), datetime(2024, 6, 12))
+
+    assert QueryFilter.from_query("what's new today?", now=NOW).after == datetime(2024, 6, 12)
+    assert QueryFilter.from_query('anything in the last 2 weeks?', now=NOW).after == datetime(2024, 5, 29, 15, 30)
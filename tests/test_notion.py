@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from notion_client import APIErrorCode, APIResponseError
+
+from src.docs import NotionPage
+from src.ratelimiter import TokenBucket
+from src.retrievers.notion import NotionRetriever
+
+
+def api_error(status: int, code: APIErrorCode, headers: dict[str, str] | None = None) -> APIResponseError:
+    return APIResponseError(httpx.Response(status, headers=headers or {}), code.value, code)
+
+
+def paragraph(text: str, has_children: bool = False, block_id: str = '') -> dict:
+    return {'id': block_id, 'type': 'paragraph', 'has_children': has_children,
+            'paragraph': {'rich_text': [{'text': {'content': text}}]}}
+
+
+class FakeNotionClient:
+    def __init__(self, n_pages: int, blocks: dict[str, list[dict]], page_size: int, rate_limited: int = 0):
+        """a notion workspace with n_pages pages and the child blocks of every block. every list is paginated with
+        page_size results per page. the first rate_limited requests are answered with 429."""
+        self.pages = [{
+            'object': 'page',
+            'id': f'{i:032x}',
+            'url': f'https://www.notion.so/Page-{i:032x}',
+            'last_edited_time': '2023-01-01T00:00:00.000Z',
+            'parent': {'type': 'workspace', 'workspace': True},
+            'properties': {'Name': {'id': 'title', 'title': [{'text': {'content': f'Page {i}'}}]}},
+        } for i in range(n_pages)]
+        self.children = blocks
+        self.page_size = page_size
+        self.rate_limited = rate_limited
+        self.requests: list[tuple[str, str | None]] = []
+        self.blocks = SimpleNamespace(children=SimpleNamespace(list=self.list_children))
+
+    def paginate(self, results: list[dict], start_cursor: str | None) -> dict:
+        if self.rate_limited:
+            self.rate_limited -= 1
+            raise api_error(429, APIErrorCode.RateLimited, {'retry-after': '2'})
+        start = int(start_cursor or 0)
+        end = start + self.page_size
+        return {'results': results[start:end], 'has_more': end < len(results),
+                'next_cursor': str(end) if end < len(results) else None}
+
+    def search(self, query: str, page_size: int, start_cursor: str | None = None) -> dict:
+        self.requests.append(('search', start_cursor))
+        return self.paginate(self.pages, start_cursor)
+
+    def list_children(self, block_id: str, page_size: int, start_cursor: str | None = None) -> dict:
+        self.requests.append((block_id, start_cursor))
+        return self.paginate(self.children.get(block_id, []), start_cursor)
+
+
+def test_rate_limited_requests_wait_as_long_as_notion_asks(clock):
+    limiter = TokenBucket(rate=3)
+    client = FakeNotionClient(n_pages=1, blocks={}, page_size=10, rate_limited=2)
+
+    response = NotionPage.request(limiter, client.search, query='', page_size=10)
+    assert [page['id'] for page in response['results']] == [f'{0:032x}']
+    assert clock.now == pytest.approx(4)
+    assert len(client.requests) == 3
+
+    client.rate_limited = 10
+    with pytest.raises(APIResponseError):
+        NotionPage.request(limiter, client.search, query='', page_size=10, max_retries=1)
+
+    def not_found(**kwargs):
+        raise api_error(404, APIErrorCode.ObjectNotFound)
+
+    with pytest.raises(APIResponseError):
+        NotionPage.request(limiter, not_found)
+    assert len(client.requests) == 5  # errors other than rate limits aren't retried
+
+
+def test_pages_and_their_blocks_are_fetched_from_every_page_of_results(config, clock, monkeypatch):
+    page_id = f'{1:032x}'
+    blocks = {
+        page_id: [paragraph(f'paragraph {i}') for i in range(4)] + [paragraph('list', True, 'B1')],
+        'B1': [paragraph('nested 0'), paragraph('nested 1'), paragraph('nested 2')],
+    }
+    client = FakeNotionClient(n_pages=3, blocks=blocks, page_size=2, rate_limited=1)
+    monkeypatch.setattr('src.retrievers.notion.Client', lambda auth: client)
+    config.notion_scraping_workers = 1
+
+    retriever = NotionRetriever(config)
+
+    assert sorted(doc.url[-32:] for doc in retriever.docs.values()) == [f'{i:032x}' for i in range(3)]
+    assert [request for request in client.requests if request[0] == 'search'] == \
+           [('search', None), ('search', None), ('search', '2')]  # the rate limited request is repeated
+    assert [request for request in client.requests if request[0] in (page_id, 'B1')] == \
+           [(page_id, None), (page_id, '2'), (page_id, '4'), ('B1', None), ('B1', '2')]
+    body = retriever.docs[f'https://www.notion.so/Page-{page_id}'].body
+    assert body.split('\n') == ['', 'paragraph 0', 'paragraph 1', 'paragraph 2', 'paragraph 3', 'list',
+                                '  nested 0', '  nested 1', '  nested 2']
@@ -0,0 +1,30 @@
+from src.chat_interfaces.prompt_builder import PromptBuilder, TOKENS_PER_REPLY
+from src.docs import Doc
+from src.snapshot import IndexSnapshot
+
+
+def test_prompts_are_built_from_the_token_counts_of_the_snapshot(config, monkeypatch, slack_message, save_snapshot):
+    docs = [slack_message(i, ' '.join(f'word{j}' for j in range(50 * i + 10))) for i in range(4)]
+    token_counts = save_snapshot(docs)
+    with open(config.file_system_prompt) as f:
+        builder = PromptBuilder(config, f.read())
+
+    # a restarted app never tokenizes the docs, only the template once and the short parts around the docs
+    snapshot = IndexSnapshot.load(config.file_snapshot, config)
+    texts = {str(doc) for doc in docs}
+    count_tokens = Doc.count_tokens
+
+    def count_tokens_except_docs(text: str, model: str) -> int:
+        assert not any(doc_text in text for doc_text in texts), 'a doc was tokenized'
+        return count_tokens(text, model)
+
+    monkeypatch.setattr(Doc, 'count_tokens', staticmethod(count_tokens_except_docs))
+    history = [{'role': 'user', 'content': 'what are the words?'}]
+    messages, id_2_doc, breakdown = builder.build(list(snapshot.embedded_docs), history)
+
+    assert id_2_doc == {f'Document {i}': doc.url for i, doc in enumerate(docs)}
+    assert breakdown['docs'] == token_counts.sum()
+    monkeypatch.setattr(Doc, 'count_tokens', staticmethod(count_tokens))
+    exact_total = sum(builder.count_tokens(message) for message in messages) + TOKENS_PER_REPLY
+    # counting the parts separately may only overestimate by a few tokens where the parts meet
+    assert 0 <= breakdown['total'] - exact_total <= 3 * len(docs) + 3
@@ -0,0 +1,24 @@
+import numpy as np
+
+from src.query_embedding_cache import QueryEmbeddingCache
+
+
+def test_the_disk_cache_is_only_compacted_on_checkpoints(config, monkeypatch):
+    config.query_embedding_cache_size = 2
+    cache = QueryEmbeddingCache(config)
+    compactions = []
+    compact = cache.store.compact
+    monkeypatch.setattr(cache.store, 'compact', lambda keep: compactions.append(keep) or compact(keep))
+
+    for i in range(10):
+        cache.add(f'question {i}', np.full(4, i, dtype=np.float32))
+    assert compactions == []
+    assert len(cache.store) == 10
+
+    cache.checkpoint()
+    assert compactions == [{cache.key('question 8'), cache.key('question 9')}]
+    assert len(cache.store) == 2
+
+    restarted = QueryEmbeddingCache(config)
+    assert restarted.get('Question  9').tolist() == [9] * 4
+    assert restarted.get('question 0') is None
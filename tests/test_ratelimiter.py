@@ -0,0 +1,36 @@
+import pytest
+
+from src.ratelimiter import TokenBucket
+
+
+def test_requests_are_paced_at_the_rate_after_a_burst(clock):
+    bucket = TokenBucket(rate=2, capacity=2)
+
+    times = []
+    for _ in range(6):
+        bucket.acquire()
+        times.append(clock.now)
+
+    assert times == pytest.approx([0, 0, 0.5, 1, 1.5, 2])
+
+
+def test_tokens_refill_up_to_the_capacity(clock):
+    bucket = TokenBucket(rate=3)
+    for _ in range(3):
+        bucket.acquire()
+    clock.now += 10
+
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert clock.now == pytest.approx(10 + 1 / 3)
+
+
+def test_pauses_hold_back_all_tokens(clock):
+    bucket = TokenBucket(rate=3)
+    bucket.pause(2)
+    bucket.pause(1)  # a shorter pause doesn't end the longer one
+
+    bucket.acquire()
+    assert clock.now == pytest.approx(2)
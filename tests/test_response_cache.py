@@ -0,0 +1,71 @@
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.chat_interfaces.type import ChatInterface
+from src.docs import SlackConvo
+from src.response_cache import ResponseCache
+
+DOC = SlackConvo(
+    body='contractors get 10 days of pto', header='Slack message in #hr from U1 at 2023-01-01',
+    url='https://test.slack.com/archives/C00000001/p16725312000000000', last_edited='2023-01-01T00:00:00',
+)
+QUERY_VECTOR = np.ones(4, dtype=np.float32) / 2
+
+
+def test_responses_are_only_shared_after_the_same_history(config):
+    cache = ResponseCache(config)
+    history_a = [{'role': 'user', 'content': 'how much pto do employees get?'},
+                 {'role': 'assistant', 'content': '25 days'}]
+    history_b = [{'role': 'user', 'content': 'how much sick leave do interns get?'},
+                 {'role': 'assistant', 'content': '5 days'}]
+    cache.add(QUERY_VECTOR, [DOC], history_a, 'contractors get 10 days of pto')
+
+    assert cache.get(QUERY_VECTOR, [DOC], history_a) == 'contractors get 10 days of pto'
+    assert cache.get(QUERY_VECTOR, [DOC], history_b) is None
+    assert cache.get(QUERY_VECTOR, [DOC], []) is None
+
+    cache.invalidate(set())
+    assert cache.get(QUERY_VECTOR, [DOC], history_a) is None
+
+
+class FakeInterface(ChatInterface):
+    def __init__(self, config):
+        """answers every prompt from the same doc, with a chat model that numbers its answers.
+        prompts are embedded randomly, so different prompts are never similar."""
+        super().__init__(config)
+        self.select_docs = lambda prompt: (self.embedding(prompt), [DOC])
+        self.completions = 0
+
+        def create(**kwargs):
+            self.completions += 1
+            delta = SimpleNamespace(content=f'answer {self.completions}')
+            return [SimpleNamespace(choices=[SimpleNamespace(delta=delta)])]
+
+        self.openai_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    def __call__(self):
+        pass
+
+    @staticmethod
+    def embedding(prompt: str) -> np.ndarray:
+        vector = np.random.default_rng(zlib.crc32(prompt.encode())).normal(size=16)
+        return vector / np.linalg.norm(vector)
+
+
+def test_follow_up_questions_of_different_users_are_not_shared(config):
+    interface = FakeInterface(config)
+    ask = lambda prompt, user_id: ''.join(interface.stream_response(prompt, user_id))
+
+    ask('how much pto do employees get?', 'A')
+    ask('what about interns?', 'B')
+    answer_a = ask('and for contractors?', 'A')
+    answer_b = ask('and for contractors?', 'B')
+
+    assert answer_a != answer_b
+    assert interface.completions == 4
+
+    # a new conversation that starts with the same question gets the cached answer
+    assert ask('how much pto do employees get?', 'C') == 'answer 1'
+    assert interface.completions == 4
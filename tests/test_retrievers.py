@@ -0,0 +1,115 @@
+from datetime import datetime
+
+import pytest
+
+from src.docs import SlackConvo
+from src.docs.type import Doc
+from src.retrievers.slack import SlackRetriever
+from src.retrievers.type import Retriever
+
+
+class StaticRetriever(Retriever):
+    def __init__(self, config, docs: list[SlackConvo]):
+        """a retriever with fixed docs."""
+        self.fetched_docs = docs
+        super().__init__(config.file_slack, config, SlackConvo)
+
+    def _fetch_docs(self):
+        yield from self.fetched_docs
+
+
+def count_upserted_segments(retriever: Retriever, monkeypatch) -> list[int]:
+    counts = []
+    upsert_segments = retriever.doc_store.upsert_segments
+
+    def counting_upsert(rows):
+        rows = list(rows)
+        counts.append(len(rows))
+        upsert_segments(rows)
+
+    monkeypatch.setattr(retriever.doc_store, 'upsert_segments', counting_upsert)
+    return counts
+
+
+def test_segments_are_saved_per_doc_and_only_rewritten_when_changed(config, monkeypatch, slack_message):
+    config.doc_token_limit = 60
+    config.doc_token_overlap = 5
+    docs = [slack_message(i, ' '.join(f'word{j}' for j in range(100 * i + 10))) for i in range(5)]
+    retriever = StaticRetriever(config, docs)
+    counts = count_upserted_segments(retriever, monkeypatch)
+
+    segments = retriever.segments
+    assert counts == [5]
+    assert len(segments) > 5
+
+    # a restarted retriever reads the segments and their token counts instead of splitting the docs again
+    restarted = StaticRetriever(config, docs)
+    counts = count_upserted_segments(restarted, monkeypatch)
+    with monkeypatch.context() as patch:
+        patch.setattr(Doc, 'split_into_segments', lambda *args, **kwargs: 1 / 0)
+        patch.setattr(Doc, 'count_tokens', lambda *args, **kwargs: 1 / 0)
+        restored = restarted.segments
+        assert counts == []
+        assert [str(seg) for seg in restored] == [str(seg) for seg in segments]
+        assert [seg.token_count(config.model_chat) for seg in restored] == \
+               [seg.token_count(config.model_chat) for seg in segments]
+
+    # only the changed doc is split and written again
+    restarted = StaticRetriever(config, docs)
+    counts = count_upserted_segments(restarted, monkeypatch)
+    edited = slack_message(2, 'a new body')
+    edited.last_scraped = datetime(2024, 1, 1)
+    restarted.add_doc(edited)
+    assert len(restarted.segments) < len(segments)
+    assert counts == [1]
+
+    # all segments are recomputed when the settings change
+    config.doc_token_limit = 80
+    restarted.segments
+    assert counts == [1, 5]
+
+
+class FakeSlackClient:
+    def __init__(self, n_messages: int, page_size: int, fail_on_page: int | None = None):
+        """a slack workspace with one channel. conversations_history returns the newest messages first and raises
+        when fail_on_page is requested."""
+        start = datetime(2023, 1, 1).timestamp()
+        self.messages = [
+            {'ts': f'{start + i * 24 * 60 * 60:.6f}', 'user': 'U00000001', 'text': f'message {i}'}
+            for i in reversed(range(n_messages))
+        ]
+        self.page_size = page_size
+        self.fail_on_page = fail_on_page
+
+    def auth_test(self):
+        return {'url': 'https://test.slack.com/'}
+
+    def conversations_list(self, cursor=None, limit=200):
+        return {'channels': [{'id': 'C00000001', 'name': 'general', 'is_member': True}]}
+
+    def conversations_history(self, channel: str, oldest: str | None = None, cursor=None, limit=200):
+        messages = [message for message in self.messages if oldest is None or float(message['ts']) > float(oldest)]
+        page = int(cursor or 0)
+        if page == self.fail_on_page:
+            raise ConnectionError('slack is unavailable')
+        response = {'messages': messages[page * self.page_size:(page + 1) * self.page_size]}
+        if (page + 1) * self.page_size < len(messages):
+            response['response_metadata'] = {'next_cursor': str(page + 1)}
+        return response
+
+
+def test_interrupted_slack_fetch_resumes_with_older_messages(config, monkeypatch):
+    clients = iter([FakeSlackClient(60, page_size=20, fail_on_page=1), FakeSlackClient(60, page_size=20)])
+    monkeypatch.setattr('src.retrievers.slack.WebClient', lambda token: next(clients))
+
+    with pytest.raises(ConnectionError):
+        SlackRetriever(config)  # the first scrape fails on the second page
+
+    retriever = SlackRetriever(config)
+    assert len(retriever.docs) == 20
+    assert 'C00000001' not in retriever.state.get('latest_timestamps', {})
+
+    retriever.scrape_docs()
+    assert len(retriever.docs) == 60
+    assert len(retriever.doc_store) == 60
+    assert retriever.state['latest_timestamps']['C00000001'] == retriever.client.messages[0]['ts']
@@ -0,0 +1,211 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from slack_sdk.web.async_client import AsyncWebClient
+from slack_sdk.web.async_slack_response import AsyncSlackResponse
+
+from src.chat_interfaces.slack import SlackInterface
+from src.docs import Doc, SlackConvo
+from src.metrics import metrics
+
+
+@pytest.fixture
+def slack_api(monkeypatch) -> list[tuple[str, dict]]:
+    """fakes the slack web api. returns the calls that were made, except auth.test."""
+    calls = []
+
+    async def api_call(client, api_method: str, **kwargs):
+        data = {'ok': True, 'user_id': 'UBOT', 'bot_id': 'BBOT', 'team_id': 'T1'}
+        if api_method != 'auth.test':
+            args = kwargs.get('json') or kwargs.get('params') or kwargs.get('data') or {}
+            calls.append((api_method, args))
+            data = {'ok': True, 'channel': args.get('channel'), 'ts': '1.0'}
+        return AsyncSlackResponse(
+            client=client, http_verb='POST', api_url=api_method, req_args={}, data=data, headers={}, status_code=200
+        )
+
+    monkeypatch.setattr(AsyncWebClient, 'api_call', api_call)
+    return calls
+
+
+def signed_event(config, i: int, event_id: str | None = None, **fields) -> tuple[bytes, dict]:
+    """a message event signed like slack signs it. fields replace those of the event, or remove them if None."""
+    event = {'type': 'message', 'channel': 'D1', 'user': 'U1', 'text': f'question {i}', 'ts': f'{i}.0',
+             'channel_type': 'im', **fields}
+    body = json.dumps({
+        'type': 'event_callback', 'team_id': 'T1', 'api_app_id': 'A1', 'event_id': event_id or f'Ev{i}',
+        'event_time': 1, 'event': {key: value for key, value in event.items() if value is not None},
+    })
+    timestamp = str(int(time.time()))
+    signature = hmac.new(
+        config.SLACK_SIGNING_SECRET.encode(), f'v0:{timestamp}:{body}'.encode(), hashlib.sha256
+    ).hexdigest()
+    headers = {
+        'X-Slack-Request-Timestamp': timestamp, 'X-Slack-Signature': f'v0={signature}',
+        'Content-Type': 'application/json',
+    }
+    return body.encode(), headers
+
+
+def count(status: str) -> float:
+    return metrics.counters[('slack_events_total', (('status', status),))]
+
+
+def messages_sent(slack_api: list[tuple[str, dict]]) -> list[str]:
+    return [args['text'] for method, args in slack_api if method == 'chat.postMessage']
+
+
+def wait_until(condition, timeout: float = 5):
+    """bolt runs listeners after the request is acknowledged, so their effects show up a little later."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def wait_for_update(slack_api: list[tuple[str, dict]]):
+    wait_until(lambda: any(method == 'chat.update' for method, _ in slack_api))
+
+
+def test_duplicate_events_are_dropped_and_bursts_rejected(config, slack_api):
+    config.slack_workers = 0  # nothing is answered, so the queue fills up
+    config.slack_queue_size = 2
+    interface = SlackInterface(config)
+    counts = {status: count(status) for status in ('queued', 'duplicate', 'rejected')}
+
+    with TestClient(interface.create_app()) as client:
+        for body, headers in [signed_event(config, 0), signed_event(config, 0)]:
+            assert client.post('/slack/events', content=body, headers=headers).status_code == 200
+        wait_until(lambda: count('duplicate') - counts['duplicate'] == 1)
+        assert count('duplicate') - counts['duplicate'] == 1
+        assert count('queued') - counts['queued'] == 1
+
+        for i in range(1, 5):
+            body, headers = signed_event(config, i)
+            assert client.post('/slack/events', content=body, headers=headers).status_code == 200
+        wait_until(lambda: count('rejected') - counts['rejected'] == 3)
+
+    assert count('queued') - counts['queued'] == 2
+    assert count('rejected') - counts['rejected'] == 3
+    assert messages_sent(slack_api) == [SlackInterface.busy_message] * 3
+
+
+def test_workers_answer_queued_events(config, slack_api):
+    interface = SlackInterface(config)  # no docs are loaded yet, so every question gets the loading message
+
+    with TestClient(interface.create_app()) as client:
+        for i in range(3):
+            body, headers = signed_event(config, i)
+            client.post('/slack/events', content=body, headers=headers)
+        wait_until(lambda: len(messages_sent(slack_api)) == 3)
+
+    assert messages_sent(slack_api) == [SlackInterface.loading_message] * 3
+
+
+class FakeStream:
+    def __init__(self, parts: list[str], fail_after: int | None = None):
+        """a streamed chat completion that yields parts, and raises after fail_after parts."""
+        self.parts = parts
+        self.fail_after = fail_after
+
+    async def __aiter__(self):
+        for i, part in enumerate(self.parts):
+            if i == self.fail_after:
+                raise ConnectionError('stream interrupted')
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))], usage=None)
+
+
+def ready_interface(config, stream: FakeStream) -> SlackInterface:
+    """an interface that answers from one doc with a fake chat model."""
+    interface = SlackInterface(config)
+    doc = SlackConvo(
+        body='the on-call rotation changes every monday', header='Slack message in #general from U1 at 2023-01-01',
+        url='https://test.slack.com/archives/C00000001/p16725312000000000', last_edited='2023-01-01T00:00:00',
+    )
+    interface.doc_selector = SimpleNamespace(is_ready=True)
+    interface.select_docs = lambda prompt: (np.ones(4, dtype=np.float32) / 2, [doc])
+
+    async def create(**kwargs):
+        return stream
+
+    interface.async_openai_client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    return interface
+
+
+def test_blocking_steps_run_off_the_event_loop(config, slack_api):
+    interface = ready_interface(config, FakeStream(['it changes ', 'every monday']))
+    threads = []
+    for name in ('build_messages', 'cached_response'):
+        method = getattr(interface, name)
+
+        def record_thread(*args, method=method, **kwargs):
+            threads.append(threading.current_thread())
+            return method(*args, **kwargs)
+
+        setattr(interface, name, record_thread)
+
+    with TestClient(interface.create_app()) as client:
+        body, headers = signed_event(config, 0)
+        client.post('/slack/events', content=body, headers=headers)
+        wait_for_update(slack_api)
+
+    assert len(threads) == 2
+    assert all(thread is not threading.main_thread() and 'asyncio' in thread.name for thread in threads)
+    assert [args['text'] for method, args in slack_api if method == 'chat.update'] == ['it changes every monday']
+    assert interface.history.get('U1')[-1] == {'role': 'assistant', 'content': 'it changes every monday'}
+
+
+def test_streamed_answers_are_measured(config, slack_api):
+    interface = ready_interface(config, FakeStream(['it changes ', 'every monday']))
+    tokens = {kind: metrics.counters[('openai_tokens_total', (('api', 'chat'), ('type', kind)))]
+              for kind in ('prompt', 'completion')}
+    spans = metrics.histograms.get(('stage_duration_seconds', (('stage', 'get_response'),)), [None, 0, 0])[2]
+
+    with TestClient(interface.create_app()) as client:
+        body, headers = signed_event(config, 0)
+        client.post('/slack/events', content=body, headers=headers)
+        wait_for_update(slack_api)
+
+    completion_tokens = metrics.counters[('openai_tokens_total', (('api', 'chat'), ('type', 'completion')))]
+    assert completion_tokens - tokens['completion'] == Doc.count_tokens('it changes every monday', config.model_chat)
+    assert metrics.counters[('openai_tokens_total', (('api', 'chat'), ('type', 'prompt')))] > tokens['prompt']
+    assert metrics.histograms[('stage_duration_seconds', (('stage', 'get_response'),))][2] == spans + 1
+
+
+def test_failed_answer_replaces_the_placeholder(config, slack_api):
+    interface = ready_interface(config, FakeStream(['it changes ', 'every monday'], fail_after=1))
+    failed = count('failed')
+
+    with TestClient(interface.create_app()) as client:
+        body, headers = signed_event(config, 0)
+        client.post('/slack/events', content=body, headers=headers)
+        wait_for_update(slack_api)
+
+    assert messages_sent(slack_api) == [SlackInterface.placeholder_message]
+    assert [args['text'] for method, args in slack_api if method == 'chat.update'] == [SlackInterface.error_message]
+    assert count('failed') == failed + 1
+
+
+def test_messages_from_bots_are_not_answered(config, slack_api):
+    interface = ready_interface(config, FakeStream(['it changes ', 'every monday']))
+    answered = count('answered')
+
+    with TestClient(interface.create_app()) as client:
+        for body, headers in [
+            signed_event(config, 0, subtype='bot_message', user=None, bot_id='B2', username='another bot'),
+            signed_event(config, 1),
+        ]:
+            client.post('/slack/events', content=body, headers=headers)
+        wait_until(lambda: count('answered') == answered + 2)
+
+    assert count('answered') == answered + 2
+    assert messages_sent(slack_api) == [SlackInterface.placeholder_message]
+    assert [args['text'] for method, args in slack_api if method == 'chat.update'] == ['it changes every monday']
@@ -0,0 +1,21 @@
+import numpy as np
+
+from src.indexes.brute_force import BruteForceIndex
+from src.indexes.type import VectorIndex
+
+
+def test_top_k_sorts_only_the_highest_similarities():
+    similarities = np.array([0.1, 0.9, 0.5, 0.7, 0.3])
+
+    assert VectorIndex.top_k(similarities, 2).tolist() == [1, 3]
+    assert VectorIndex.top_k(similarities, 10).tolist() == [1, 3, 2, 4, 0]
+    assert VectorIndex.top_k(similarities, 0).tolist() == []
+    assert VectorIndex.top_k(similarities, -1).tolist() == []
+
+
+def test_brute_force_search_with_k_0(config):
+    index = BruteForceIndex(config)
+    index.build(np.eye(3, dtype=np.float32), ['a' * 32, 'b' * 32, 'c' * 32])
+
+    rows, similarities = index.search(np.array([1, 0, 0], dtype=np.float32), k=0)
+    assert rows.tolist() == [] and similarities.tolist() == []